@@ -52,8 +52,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.querybudget.QueryInspectorMiddleware',
 ]
 
+# Логировать N+1 и превышения бюджета запросов (см. query_budgets в urls.py)
+QUERY_INSPECTOR = DEBUG
+
 
 
 ROOT_URLCONF = 'core.urls'
@@ -85,6 +89,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: пишущие транзакции ждут блокировку (timeout), а не падают
+            # с "database is locked" при апгрейде read -> write (см. stress_purchases)
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# В проде заменить на общий бэкенд (Redis/Memcached), чтобы инвалидация
+# (категории, фрагменты карточек и т.д.) доходила до всех воркеров.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'e-bozor',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -140,5 +164,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Резерв товара из корзины, секунд (products.inventory)
+CART_HOLD_TTL = 15 * 60
+
+# Живая доставка сообщений (SSE, users.views.chat_stream) — только под
+# ASGI-сервером (uvicorn core.asgi:application); под WSGI и runserver поток
+# отключён, чат обновляется перезагрузкой. In-process брокер работает в
+# пределах одного ASGI-воркера; для нескольких — общий брокер с тем же интерфейсом.
+CHAT_BROKER = 'users.broker.InProcessBroker'
+# Сообщения старше этого уходят в ArchivedMessage (manage.py archive_messages)
+CHAT_ARCHIVE_AFTER_DAYS = 180
+
+# Письма (напоминания, manage.py send_reminders). В разработке — в консоль;
+# на проде — SMTP-бэкенд и его настройки.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'E-Bozor <noreply@localhost>'
+
 LOGIN_REDIRECT_URL = 'main:index'
 LOGOUT_REDIRECT_URL = 'main:index'
\ No newline at end of file
@@ -10,3 +10,9 @@ urlpatterns = [
     path('users/', include('django.contrib.auth.urls')),
     path("products/", include('products.urls')),
 ] + static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT)
+
+# Бюджеты запросов для URL без namespace (django.contrib.auth)
+query_budgets = {
+    'login': 1,
+    'password_change': (2, 6),
+}
@@ -0,0 +1,90 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+
+STAMP_KEY = 'catalog:stamp'
+PAGE_TIMEOUT = 600
+# Только эти параметры влияют на страницы каталога, остальные (utm_* и т.п.) игнорируем
+CACHED_PARAMS = ('q', 'min_price', 'max_price', 'sort', 'cursor')
+
+
+def catalog_stamp():
+    """Время (в целых секундах) последнего изменения каталога."""
+    stamp = cache.get(STAMP_KEY)
+    if stamp is None:
+        # кэш пустой/вытеснен — считаем, что всё изменилось только что
+        cache.add(STAMP_KEY, int(time.time()), None)
+        stamp = cache.get(STAMP_KEY, int(time.time()))
+    return stamp
+
+
+def invalidate():
+    # штамп строго растёт, чтобы Last-Modified отличался даже при правках в одну секунду
+    previous = cache.get(STAMP_KEY) or 0
+    cache.set(STAMP_KEY, max(int(time.time()), previous + 1), None)
+
+
+def _page_key(request, stamp, extra=''):
+    params = sorted(
+        (name, request.GET[name]) for name in CACHED_PARAMS if request.GET.get(name)
+    )
+    raw = f'{stamp}:{request.path}?{urlencode(params)}:{extra}'
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # флеш-сообщения и промокод в сессии делают страницу персональной
+    if len(get_messages(request)) or request.session.get('discount'):
+        return False
+    return True
+
+
+def anonymous_page_cache(view=None, *, vary=None):
+    """
+    Кэширует HTML страниц каталога для анонимных пользователей и отвечает
+    304 на условные GET (ETag / Last-Modified по штампу каталога).
+
+    vary(request, *args, **kwargs) — данные, которые меняются мимо штампа
+    каталога (например, резервы корзин); их значение входит в ключ и ETag.
+    """
+    if view is None:
+        return lambda view: anonymous_page_cache(view, vary=vary)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        stamp = catalog_stamp()
+        extra = vary(request, *args, **kwargs) if vary is not None else ''
+        key = _page_key(request, stamp, extra)
+        etag = quote_etag(key.split(':', 1)[1])
+        # штамп не отражает vary-данные, поэтому If-Modified-Since для таких страниц не годится
+        last_modified = stamp if vary is None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            content = cache.get(key)
+            if content is not None:
+                response = HttpResponse(content)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                cache.set(key, response.content, PAGE_TIMEOUT)
+
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    return wrapper
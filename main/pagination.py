@@ -0,0 +1,117 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+
+def _json_default(value):
+    # Decimal -> str, datetime -> ISO строка (Django сам распарсит при фильтрации)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(ordering, value, pk):
+    raw = json.dumps([ordering, value, pk], default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Возвращает (value, pk) или None, если курсор битый или от другой сортировки."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_ordering, value, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if cursor_ordering != ordering or not isinstance(pk, int):
+        return None
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_url=None):
+        self.object_list = object_list
+        self.next_url = next_url
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def keyset_filter(queryset, ordering, value, pk):
+    """
+    Строки после (value, pk) в порядке ordering. Кроме OR-условия добавлен
+    простой диапазон по полю сортировки — по нему SQLite ищет в индексе
+    сразу с нужного места, иначе просматривает все предыдущие записи.
+    """
+    descending = ordering.startswith('-')
+    field = ordering.lstrip('-')
+    lookup = 'lt' if descending else 'gt'
+    if field == 'id':
+        return queryset.filter(**{f'id__{lookup}': pk})
+    return queryset.filter(**{f'{field}__{lookup}e': value}).filter(
+        Q(**{f'{field}__{lookup}': value}) |
+        Q(**{field: value, f'id__{lookup}': pk})
+    )
+
+
+def _cursor_value(queryset, field, value):
+    """Значение из курсора, приведённое к типу поля сортировки; None — курсор битый."""
+    if field in queryset.query.annotations:
+        output_field = queryset.query.annotations[field].output_field
+    else:
+        output_field = queryset.model._meta.get_field(field)
+    try:
+        value = output_field.to_python(value)
+    except (ValidationError, ValueError, TypeError):
+        return None
+    return value
+
+
+def paginate(request, queryset, ordering='-id', per_page=PAGE_SIZE, param='cursor'):
+    """
+    Keyset (seek) пагинация: вместо OFFSET фильтруем по последнему
+    показанному (значение сортировки, id), поэтому глубокие страницы
+    стоят столько же, сколько первая. Битый курсор — первая страница.
+    """
+    descending = ordering.startswith('-')
+    field = ordering.lstrip('-')
+
+    if field == 'id':
+        queryset = queryset.order_by(ordering)
+    else:
+        # id — тай-брейкер, чтобы порядок был стабильным при одинаковых ценах/датах
+        queryset = queryset.order_by(ordering, '-id' if descending else 'id')
+
+    position = decode_cursor(request.GET.get(param), ordering)
+    if position is not None:
+        value, pk = position
+        if field != 'id':
+            value = _cursor_value(queryset, field, value)
+        if field == 'id' or value is not None:
+            queryset = keyset_filter(queryset, ordering, value, pk)
+
+    items = list(queryset[:per_page + 1])
+    next_url = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        query = request.GET.copy()
+        query[param] = encode_cursor(ordering, getattr(last, field), last.pk)
+        next_url = '?' + query.urlencode()
+
+    return KeysetPage(items, next_url)
@@ -0,0 +1,158 @@
+import logging
+import re
+import sys
+from collections import Counter
+from importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# одинаковый по форме запрос N раз за запрос — подозрение на N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+
+
+def query_shape(sql):
+    """SQL без литералов: запросы, отличающиеся только id/значениями, дают одну форму."""
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    return _IN_LISTS.sub('IN (...)', sql)
+
+
+def _query_origin():
+    """Где в шаблоне (или в нашем коде) был вызван запрос: 'index.html:27' / 'users/views.py:301'."""
+    code_frame = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code_frame is None and filename != __file__
+                and str(settings.BASE_DIR) in filename and 'site-packages' not in filename):
+            code_frame = f'{filename[len(str(settings.BASE_DIR)) + 1:]}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_frame or '?'
+
+
+class QueryRecorder:
+    """Собирает все SQL-запросы внутри with-блока вместе с местом вызова."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, _query_origin()))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(форма запроса, сколько раз, 'откуда, откуда')] для форм, повторившихся >= threshold раз."""
+        shapes = Counter()
+        origins = {}
+        for sql, origin in self.queries:
+            shape = query_shape(sql)
+            shapes[shape] += 1
+            origins.setdefault(shape, {})[origin] = None
+        return [
+            (shape, count, ', '.join(origins[shape]))
+            for shape, count in shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def get_budget(view_name, cold=False):
+    """
+    Бюджет запросов для 'namespace:name'. Бюджеты объявлены в словаре
+    query_budgets рядом с urlpatterns каждого urls.py (для URL без
+    namespace — в ROOT_URLCONF): имя URL -> максимум SQL-запросов на
+    запрос. Значение — число или пара (с прогретым кэшем, с пустым кэшем)
+    для страниц, которые читают кэшированные данные; cold=True — бюджет
+    промаха. Проверяются в main/tests.py и QueryInspectorMiddleware.
+    """
+    namespace, _, name = view_name.rpartition(':')
+    module = f'{namespace}.urls' if namespace else settings.ROOT_URLCONF
+    try:
+        budgets = getattr(import_module(module), 'query_budgets', {})
+    except ImportError:
+        return None
+    budget = budgets.get(name)
+    if isinstance(budget, tuple):
+        return budget[1] if cold else budget[0]
+    return budget
+
+
+class QueryInspectorMiddleware:
+    """
+    Dev-only: считает запросы на каждый HTTP-запрос и пишет в лог
+    превышения бюджета и повторяющиеся запросы (N+1) с шаблоном и строкой.
+    Включается настройкой QUERY_INSPECTOR.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None) or resolve(request.path_info)
+        # попал ли запрос в кэш, отсюда не видно — проверяем верхнюю границу
+        budget = get_budget(match.view_name, cold=True)
+        if budget is not None and len(recorder) > budget:
+            logger.warning(
+                '%s %s: %d queries, budget %d', request.method, request.path, len(recorder), budget
+            )
+        for shape, count, origin in recorder.repeated():
+            logger.warning(
+                '%s %s: possible N+1 at %s (%d x) %s', request.method, request.path, origin, count, shape
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    Для TestCase: assertQueryBudget('users:cart', response_callable).
+    cold_cache = True — проверять бюджет с пустым кэшем.
+    """
+    cold_cache = False
+
+    def assertQueryBudget(self, view_name, func, *args, **kwargs):
+        budget = get_budget(view_name, cold=self.cold_cache)
+        self.assertIsNotNone(budget, f'No query budget declared for {view_name}')
+        with QueryRecorder() as recorder:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(recorder), budget,
+            f'{view_name}: {len(recorder)} queries, budget {budget}:\n'
+            + '\n'.join(f'{origin}: {sql}' for sql, origin in recorder.queries)
+        )
+        repeated = recorder.repeated()
+        self.assertFalse(
+            repeated,
+            f'{view_name}: repeated queries (N+1):\n'
+            + '\n'.join(f'{origin} ({count} x): {shape}' for shape, count, origin in repeated)
+        )
+        return result
@@ -0,0 +1,39 @@
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class VersionedRegistry:
+    """
+    Справочник в памяти процесса, сверяемый с версией в общем кэше:
+    invalidate() в одном воркере сбрасывает копии во всех остальных.
+
+    load() возвращает (данные, expires_at): если expires_at задан, данные
+    перечитываются и после этого момента, даже без смены версии.
+    """
+
+    def __init__(self, version_key, load):
+        self.version_key = version_key
+        self._load = load
+        # (версия, данные, expires_at) — заменяется целиком, одним присваиванием
+        self._state = (None, None, None)
+
+    def _current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        return version
+
+    def get(self):
+        version = self._current_version()
+        loaded_version, data, expires_at = self._state
+        if loaded_version != version or (expires_at is not None and expires_at <= timezone.now()):
+            data, expires_at = self._load()
+            self._state = (version, data, expires_at)
+        return data
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
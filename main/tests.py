@@ -1,3 +1,257 @@
-from django.test import TestCase
+import io
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import add_message, INFO
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse, get_resolver
+
+from main.pagination import encode_cursor
+from main.views import category_view
+from main.querybudget import QueryBudgetMixin, QueryRecorder, get_budget, query_shape
+from products.models import Category, Product, Comment
+from users import blocks, chat, ledger, saved
+from users.models import CustomUser, LedgerEntry, Saved, Order, Reminder
+
+
+class QueryShapeTests(TestCase):
+    def test_literals_are_normalized(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id = 1 AND name = 'x'"),
+            query_shape("SELECT * FROM t WHERE id = 25 AND name = 'it''s'"),
+        )
+        self.assertEqual(query_shape('WHERE id IN (1, 2, 3)'), query_shape('WHERE id IN (4)'))
+
+    def test_recorder_flags_repeated_queries(self):
+        Category.objects.create(name='a')
+        with QueryRecorder() as recorder:
+            for pk in range(3):
+                Category.objects.filter(id=pk).first()
+        self.assertEqual(len(recorder), 3)
+        [(shape, count, origin)] = recorder.repeated()
+        self.assertEqual(count, 3)
+        self.assertIn('main/tests.py', origin)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = CustomUser.objects.create(username='seller')
+        category = Category.objects.create(name='phones')
+        Product.objects.bulk_create([
+            Product(author=seller, category=category, title=f'Phone {i}', description='d', price=Decimal(i % 7),
+                    address='a', phone_number='1', tg_username='t', count=1)
+            for i in range(60)
+        ])
+
+    def test_cursor_walks_every_product_once(self):
+        seen, params = [], {'sort': 'price'}
+        while True:
+            response = self.client.get(reverse('main:category', args=['phones']), params)
+            page = response.context['page']
+            seen += [(product.price, product.id) for product in page]
+            if not page.has_next:
+                break
+            params['cursor'] = page.next_url.split('cursor=')[1]
+        self.assertEqual(seen, sorted(Product.objects.values_list('price', 'id')))
+
+    def test_broken_cursor_value_gives_first_page(self):
+        for sort, value in (('price', 'abc'), ('price', None), ('date', 'notadate'), ('-rating', 'x')):
+            response = self.client.get(
+                reverse('main:category', args=['phones']), {'sort': sort, 'cursor': encode_cursor(sort, value, 5)}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['page']), 24)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = CustomUser.objects.create_user('seller', password='x')
+        self.category = Category.objects.create(name='phones')
+        self.product = Product.objects.create(
+            author=self.seller, category=self.category, title='Phone', description='d',
+            price=Decimal('10'), address='a', phone_number='1', tg_username='t', count=1,
+        )
+        self.url = reverse('main:category', args=['phones'])
+
+    def test_not_modified_by_etag(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_since(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_gives_fresh_page(self):
+        changes = (
+            lambda: Product.objects.get(id=self.product.id).save(),
+            lambda: Comment.objects.create(product=self.product, author=self.seller, body='ok', rating=5),
+            lambda: Category.objects.create(name='tablets'),
+        )
+        for change in changes:
+            etag = self.client.get(self.url)['ETag']
+            change()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_logged_in_user_bypasses_cache(self):
+        self.client.force_login(self.seller)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_session_promo_bypasses_cache(self):
+        session = self.client.session
+        session['discount'] = 10
+        session.save()
+        self.assertNotIn('ETag', self.client.get(self.url))
+
+    def test_flash_message_bypasses_cache(self):
+        request = RequestFactory().get(self.url)
+        request.user = AnonymousUser()
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+        add_message(request, INFO, 'hello')
+        self.assertNotIn('ETag', category_view(request, 'phones'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    # по 3 объекта каждого вида, чтобы N+1 проявлялся как повтор запроса
+    ITEMS = 3
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('buyer', password='x')
+        ledger.credit(self.user, Decimal('1000'), kind=LedgerEntry.OPENING)
+        self.seller = CustomUser.objects.create_user('seller', password='x')
+        self.category = Category.objects.create(name='phones')
+        self.products = [
+            Product.objects.create(
+                author=self.seller, category=self.category, title=f'Phone {i}', description='d',
+                price=Decimal('10'), address='a', phone_number='1', tg_username='t', count=10,
+            )
+            for i in range(self.ITEMS)
+        ]
+        self.product = self.products[0]
+        for product in self.products:
+            Saved.objects.create(author=self.user, product=product)
+            Order.objects.create(user=self.user, product=product, price=product.price)
+            Comment.objects.create(author=self.user, product=product, body='ok', rating=5)
+            chat.record_message(self.seller, self.user, 'hi')
+            Reminder.objects.create(user=self.user, title='r', date='2026-01-01')
+        # баланс, непрочитанные, блокировки и сохранённые берутся из кэша — прогреваем, как у активного пользователя
+        for user in (self.user, self.seller):
+            user.balance, chat.unread_count(user), blocks.block_sets(user.id), saved.saved_ids(user.id)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['cart'] = {str(product.id): 1 for product in self.products}
+        session['recently_viewed'] = [product.id for product in self.products]
+        session.save()
+
+    def test_every_url_declares_a_budget(self):
+        missing = [
+            f'{namespace}:{name}'
+            for namespace in ('main', 'products', 'users')
+            for name in get_resolver().namespace_dict[namespace][1].reverse_dict
+            if isinstance(name, str) and get_budget(f'{namespace}:{name}') is None
+        ]
+        self.assertEqual(missing, [])
+
+    def get(self, view_name, *args, **params):
+        return self.assertQueryBudget(view_name, self.client.get, reverse(view_name, args=args), params)
+
+    def post(self, view_name, *args, **data):
+        return self.assertQueryBudget(view_name, self.client.post, reverse(view_name, args=args), data)
+
+    def test_catalog_pages(self):
+        self.get('main:index')
+        self.get('main:index', q='phone')
+        self.get('main:category', 'phones', sort='price')
+        self.get('products:detail', self.product.id)
+        self.get('users:saveds')
+        self.get('users:recently_viewed')
+
+    def test_product_pages(self):
+        self.get('products:new')
+        self.client.force_login(self.seller)
+        self.get('products:update', self.product.id)
+        self.get('products:delete', self.product.id)
+
+    def test_add_product_image(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        self.client.force_login(self.seller)
+        self.post('products:add_image', self.product.id,
+                  images=SimpleUploadedFile('1.png', buffer.getvalue(), content_type='image/png'))
+
+    def test_comment_actions(self):
+        self.client.force_login(self.seller)
+        self.post('products:comment_new', self.product.id, body='nice', rating='4')
+        comment = Comment.objects.filter(author=self.seller).get()
+        self.get('products:comment_delete', self.product.id, comment.id)
+
+    def test_profile_pages(self):
+        self.get('users:profile', self.user.username)
+        self.get('users:update')
+        self.get('users:addremovesaved', self.product.id)
+        self.get('users:calendar', start='2025-12-28T00:00:00+05:00', end='2026-02-08T00:00:00+05:00')
+        self.get('password_change')
+
+    def test_cart_page(self):
+        self.get('users:cart')
+        Product.objects.filter(id=self.product.id).delete()
+        self.get('users:cart')
+
+    def test_orders_page(self):
+        self.get('users:orders')
+
+    def test_cart_actions(self):
+        self.post('users:add_to_cart', self.product.id, quantity=1)
+        self.post('users:deposit', amount='10')
+        self.post('users:apply_promo', promo_code='sale10')
+
+    def test_checkout_all(self):
+        self.post('users:checkout_all')
+
+    def test_buy_now(self):
+        self.post('users:buy_now', self.product.id, quantity_hidden=1)
+
+    def test_order_history_actions(self):
+        self.get('users:delete_order', Order.objects.first().id)
+        self.post('users:clear_orders')
+        self.post('users:cart_clear')
+
+    def test_chat_pages(self):
+        self.get('users:chat_list')
+        self.get('users:chat_detail', self.seller.id)
+        self.post('users:chat_detail', self.seller.id, text='hello')
+        self.get('users:chat_history', self.seller.id)
+        self.post('users:chat_read', self.seller.id)
+        self.get('users:block_user', self.seller.id)
+        self.get('users:unblock_user', self.seller.id)
+
+    def test_anonymous_pages(self):
+        self.client.logout()
+        self.get('users:signup')
+        self.get('login')
+        self.get('users:logout')
+
+
+class ColdCacheQueryBudgetTests(QueryBudgetTests):
+    """Те же страницы, но кэш пуст перед каждым запросом: бюджет промаха кэша."""
+    cold_cache = True
+
+    def assertQueryBudget(self, view_name, func, *args, **kwargs):
+        cache.clear()
+        return super().assertQueryBudget(view_name, func, *args, **kwargs)
@@ -7,3 +7,8 @@ urlpatterns = [
     path('', IndexView.as_view(), name='index'),
     path('<str:category_name>/category', category_view, name='category'),
 ]
+
+query_budgets = {
+    'index': (5, 9),
+    'category': (3, 8),
+}
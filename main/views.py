@@ -1,33 +1,62 @@
 from django.shortcuts import render
 from django.views import View
-from products.models import Product, Category
+from django.utils.decorators import method_decorator
+from products.models import Product
+from products.search import search_products
+from products.categories import get_categories, get_category_id
+from users.cart import cart_size
+from users.chat import unread_count
+from users.saved import saved_ids
 from django.shortcuts import get_object_or_404
+from django.db.models import Case, When, Value, F, FloatField, ExpressionWrapper
+
+from .pagination import paginate
+from .pagecache import anonymous_page_cache
 
 
 # Create your views here.
 
 def for_all_pages(request):
-    categories = Category.objects.all()
-    return {"categories": categories}
+    context = {"categories": get_categories()}
+    if request.user.is_authenticated:
+        context["cart_count"] = cart_size(request.session.get('cart', {}))
+        context["unread_messages_count"] = unread_count(request.user)
+    return context
+
 
+def _saved_ids(request):
+    # Отметка «сохранено» на карточках — вне кэша фрагментов, из кэшированного набора
+    if request.user.is_authenticated:
+        return saved_ids(request.user.id)
+    return frozenset()
 
+
+@method_decorator(anonymous_page_cache, name='get')
 class IndexView(View):
     def get(self, request):
         products = Product.objects.all()
+        ordering = '-id'
         q = request.GET.get('q', '')
         if q:
-            products = products.filter(title__icontains=q)
-        return render(request, "index.html", {'products': products})
+            products = search_products(products, q)
+            ordering = '-search_rank'
+        page = paginate(request, products, ordering)
+        return render(request, "index.html", {'products': page, 'page': page, 'saved_ids': _saved_ids(request)})
 
 
+@anonymous_page_cache
 def category_view(request, category_name):
-    # Базовый набор товаров
-    products = Product.objects.filter(category__name=category_name)
+    # Базовый набор товаров (id категории берём из реестра, без JOIN по имени)
+    category_id = get_category_id(category_name)
+    if category_id is None:
+        products = Product.objects.none()
+    else:
+        products = Product.objects.filter(category_id=category_id)
 
     # 1. Поиск
     query = request.GET.get('q')
     if query:
-        products = products.filter(title__icontains=query)
+        products = search_products(products, query)
 
     # 2. Мин цена
     min_price = request.GET.get('min_price')
@@ -40,18 +69,29 @@ def category_view(request, category_name):
         products = products.filter(price__lte=max_price)
 
     # 4. Сортировка (ИСПРАВЛЕНО: используем 'date' вместо 'created_at')
-    sort = request.GET.get('sort', '-date')
+    sort = request.GET.get('sort', '')
 
     # Проверка, чтобы Django не упал, если в sort придет несуществующее поле
-    allowed_sorts = ['price', '-price', 'date', '-date']
+    allowed_sorts = ['price', '-price', 'date', '-date', '-rating']
     if sort not in allowed_sorts:
-        sort = '-date'
+        # При поиске без явной сортировки — по релевантности
+        sort = '-search_rank' if query else '-date'
+
+    if sort == '-rating':
+        # Средняя оценка из хранимых агрегатов — без JOIN/AVG по комментариям
+        products = products.annotate(rating=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=ExpressionWrapper(F('rating_sum') * 1.0 / F('rating_count'), output_field=FloatField()),
+            output_field=FloatField(),
+        ))
 
-    products = products.order_by(sort)
+    page = paginate(request, products, sort)
 
     context = {
         'category': category_name,
-        'products': products,
+        'products': page,
+        'page': page,
+        'saved_ids': _saved_ids(request),
     }
     return render(request, 'category.html', context)
 
@@ -11,6 +11,11 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['title', 'id', "date", 'category', "author"]
     inlines = [ProductImageInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # картинки могли поменяться в инлайне — пересчитываем обложку
+        form.instance.update_cover()
+
 
 admin.site.register(Category)
 admin.site.register(Product,ProductAdmin)
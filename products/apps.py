@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductsConfig(AppConfig):
     name = 'products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import install
+        post_migrate.connect(install, sender=self)
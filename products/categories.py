@@ -0,0 +1,28 @@
+from main.registry import VersionedRegistry
+
+from .models import Category
+
+
+def _load():
+    categories = list(Category.objects.order_by('id'))
+    return {
+        'categories': categories,
+        'ids': {category.name: category.id for category in categories},
+    }, None
+
+
+# Справочник категорий в памяти процесса; правка категории в одном воркере
+# сбрасывает его во всех остальных.
+_registry = VersionedRegistry('categories:version', _load)
+
+
+def get_categories():
+    return _registry.get()['categories']
+
+
+def get_category_id(name):
+    return _registry.get()['ids'].get(name)
+
+
+def invalidate():
+    _registry.invalidate()
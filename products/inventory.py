@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import StockHold
+
+# Сколько живёт резерв из корзины (секунды)
+HOLD_TTL = getattr(settings, 'CART_HOLD_TTL', 15 * 60)
+
+
+def held_quantities(product_ids, exclude_user=None):
+    """{product_id: сколько сейчас зарезервировано} одним GROUP BY по индексу (product, expires_at)."""
+    holds = StockHold.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    return dict(holds.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+
+
+def available_stock(product, user=None):
+    """Остаток минус чужие действующие резервы."""
+    exclude = user if user is not None and user.is_authenticated else None
+    held = held_quantities([product.id], exclude_user=exclude).get(product.id, 0)
+    return max(product.count - held, 0)
+
+
+def place_hold(user, product, quantity):
+    """
+    Резервирует quantity (итоговое количество в корзине) на HOLD_TTL.
+    Строка товара не трогается — пишем только в таблицу резервов (upsert).
+    """
+    StockHold.objects.bulk_create(
+        [StockHold(product=product, user=user, quantity=quantity,
+                   expires_at=timezone.now() + timedelta(seconds=HOLD_TTL))],
+        update_conflicts=True,
+        unique_fields=['product', 'user'],
+        update_fields=['quantity', 'expires_at'],
+    )
+
+
+def release_holds(user, product_ids=None):
+    holds = StockHold.objects.filter(user=user)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    holds.delete()
+
+
+def sweep_expired(batch_size=1000):
+    """Удаляет истёкшие резервы пачками, чтобы не держать длинную блокировку. Возвращает число удалённых."""
+    now = timezone.now()
+    removed = 0
+    while True:
+        ids = list(StockHold.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += StockHold.objects.filter(id__in=ids).delete()[0]
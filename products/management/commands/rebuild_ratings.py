@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from products.models import Product, Comment
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Product.rating_sum / rating_count по комментариям с оценкой.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help='только эти товары (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['product_ids']:
+            products = products.filter(id__in=options['product_ids'])
+
+        rated = Comment.objects.filter(product=OuterRef('pk'), rating__gt=0).values('product')
+        updated = products.update(
+            rating_sum=Coalesce(Subquery(rated.annotate(s=Sum('rating')).values('s')), Value(0)),
+            rating_count=Coalesce(Subquery(rated.annotate(c=Count('id')).values('c')), Value(0)),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Ratings rebuilt for {updated} products.'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.inventory import sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие резервы товаров из корзин (пачками). С --interval работает в цикле.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=int, default=0, help='секунд между проходами (0 — один проход)')
+
+    def handle(self, *args, **options):
+        while True:
+            removed = sweep_expired(options['batch_size'])
+            self.stdout.write(f'Expired holds removed: {removed}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_covers(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    first_image = ProductImage.objects.filter(product=OuterRef('pk')).order_by('id').values('image')[:1]
+    Product.objects.update(cover=Coalesce(Subquery(first_image), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cover',
+            field=models.ImageField(blank=True, upload_to='product_images'),
+        ),
+        migrations.RunPython(fill_covers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Comment = apps.get_model('products', 'Comment')
+    rated = Comment.objects.filter(product=OuterRef('pk'), rating__gt=0).values('product')
+    Product.objects.update(
+        rating_sum=Coalesce(Subquery(rated.annotate(s=Sum('rating')).values('s')), Value(0)),
+        rating_count=Coalesce(Subquery(rated.annotate(c=Count('id')).values('c')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_cover'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
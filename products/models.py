@@ -1,6 +1,5 @@
 from django.db import models
 from users.models import CustomUser
-from django.db.models import Avg
 # Create your models here.
 
 class Category(models.Model):
@@ -21,17 +20,39 @@ class Product(models.Model):
     tg_username = models.CharField(max_length=100)
     date = models.DateTimeField(auto_now_add=True)
     count = models.PositiveIntegerField(default=1) # new
+    # Денормализованная обложка (= первая картинка), чтобы сетка карточек не ходила в images
+    cover = models.ImageField(upload_to='product_images', blank=True)
+    # Агрегаты оценок, обновляются в new_comment / delete_comment (см. rebuild_ratings)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Штамп версии карточки: меняется при сохранении товара и при изменении его картинок
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def update_cover(self):
+        first = self.images.order_by('id').first()
+        self.cover = first.image.name if first else ''
+        self.save(update_fields=['cover', 'updated_at'])
+
+    @property
+    def version(self):
+        return int(self.updated_at.timestamp() * 1_000_000)
 
     @property
     def average_rating(self):
-        avg = self.comments.filter(rating__gt=0).aggregate(avg=Avg('rating'))['avg']
-        return avg or 0
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ('-id',)
+        # Под keyset-пагинацию category_view: фильтр по категории + сортировка (price|date, id)
+        indexes = [
+            models.Index(fields=['category', 'price', 'id'], name='product_cat_price_idx'),
+            models.Index(fields=['category', 'date', 'id'], name='product_cat_date_idx'),
+        ]
 
 
 class ProductImage(models.Model):
@@ -52,3 +73,39 @@ class Comment(models.Model):
 
     def __str__(self):
         return f"Comment of {self.author.username}"
+
+
+class StockHold(models.Model):
+    """Временный резерв товара из корзины; истёкшие удаляет sweep_stock_holds."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='stock_holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user'], name='unique_stock_hold'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='stockhold_product_exp_idx'),
+            models.Index(fields=['expires_at'], name='stockhold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} holds {self.quantity} x {self.product}"
+
+
+class ProductSearchIndex(models.Model):
+    """
+    Строка FTS5-индекса товаров (rowid = id товара) — только для JOIN в
+    products.search; таблицу и триггеры создаёт search.install.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='search_index'
+    )
+    # скрытый столбец FTS5 с именем таблицы: слева от MATCH и первым аргументом bm25()
+    document = models.TextField(db_column='products_product_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
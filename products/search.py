@@ -0,0 +1,120 @@
+import re
+
+from django.db import connection, connections, OperationalError
+from django.db.models import Value, FloatField, F, Func, Lookup, Q
+
+from .models import ProductSearchIndex
+
+FTS_TABLE = ProductSearchIndex._meta.db_table
+
+# external content FTS5: сам текст лежит в products_product, в индексе только токены
+_CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    title, description,
+    content='products_product', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+_available = None
+
+
+def install(using='default', **kwargs):
+    """
+    Создаёт FTS-таблицу и триггеры синхронизации (идемпотентно).
+
+    Вызывается на post_migrate: SQLite-миграции Django пересоздают таблицу
+    products_product при изменении полей и вместе с ней теряют триггеры.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        created = FTS_TABLE not in conn.introspection.table_names(cursor)
+        try:
+            cursor.execute(_CREATE_TABLE)
+        except OperationalError:
+            # SQLite собран без FTS5 — остаёмся на icontains
+            return
+        for sql in _CREATE_TRIGGERS:
+            cursor.execute(sql)
+        if created:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def is_available():
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def to_match_query(q):
+    # каждое слово — отдельный префиксный терм в кавычках, чтобы спецсимволы FTS не ломали запрос
+    terms = re.findall(r'\w+', q)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+ProductSearchIndex._meta.get_field('document').register_lookup(Match)
+
+
+def search_products(queryset, q):
+    """
+    Фильтрует queryset товаров по запросу и добавляет аннотацию search_rank
+    (чем больше, тем релевантнее) — сортировать по '-search_rank'.
+
+    Индекс присоединяется к товарам JOIN-ом, поэтому категория и цена
+    фильтруются в том же запросе, до сортировки, и пагинация листает весь
+    результат. Заголовок весит больше описания.
+    """
+    if not is_available():
+        return queryset.filter(
+            Q(title__icontains=q) | Q(description__icontains=q)
+        ).annotate(search_rank=F('id'))
+
+    match = to_match_query(q)
+    if not match:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.filter(search_index__document__match=match).annotate(search_rank=Func(
+        F('search_index__document'),
+        function='bm25',
+        # bm25 меньше — лучше; веса столбцов: title, description
+        template='-%(function)s(%(expressions)s, 10.0, 1.0)',
+        output_field=FloatField(),
+    ))
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from main import pagecache
+from .models import Category, Product, ProductImage, Comment
+from . import categories
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    categories.invalidate()
+    pagecache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    # новая версия товара => закэшированные карточки с этим товаром больше не совпадут по ключу
+    Product.objects.filter(id=instance.product_id).update(updated_at=timezone.now())
+    pagecache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Comment)
+def catalog_changed(sender, **kwargs):
+    pagecache.invalidate()
@@ -1,3 +1,106 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from products import inventory, search
+from products.models import Category, Product, ProductSearchIndex, StockHold
+from users.models import CustomUser
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = CustomUser.objects.create(username='seller')
+        self.category = Category.objects.create(name='phones')
+
+    def product(self, title, description='d'):
+        return Product.objects.create(
+            author=self.seller, category=self.category, title=title, description=description,
+            price=Decimal('10'), address='a', phone_number='1', tg_username='t', count=1,
+        )
+
+    def indexed(self, word):
+        # смотрим в сам FTS-индекс, мимо JOIN с products_product
+        return set(ProductSearchIndex.objects.filter(
+            document__match=search.to_match_query(word)
+        ).values_list('product_id', flat=True))
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('main:index'), {'q': q, **params})
+        return response.context['page']
+
+    def test_index_follows_title_update(self):
+        product = self.product('Walkman')
+        Product.objects.filter(id=product.id).update(title='Discman')
+        self.assertEqual(self.indexed('walkman'), set())
+        self.assertEqual(self.indexed('discman'), {product.id})
+
+    def test_index_follows_delete(self):
+        product = self.product('Walkman')
+        self.assertEqual(self.indexed('walkman'), {product.id})
+        product.delete()
+        self.assertEqual(self.indexed('walkman'), set())
+
+    def test_title_match_ranks_above_description(self):
+        in_description = self.product('Case', 'fits any zebra phone')
+        in_title = self.product('Zebra phone')
+        self.assertEqual([p.id for p in self.search('zebra')], [in_title.id, in_description.id])
+
+    def test_second_page_by_cursor(self):
+        products = [self.product(f'Nokia {i}') for i in range(30)]
+        first = self.search('nokia')
+        self.assertTrue(first.has_next)
+        second = self.search('nokia', cursor=first.next_url.split('cursor=')[1])
+        self.assertFalse(second.has_next)
+        seen = [p.id for p in first] + [p.id for p in second]
+        self.assertEqual(sorted(seen), sorted(p.id for p in products))
+
+    def test_icontains_fallback_without_fts(self):
+        # FTS ищет только по началу слова, icontains — по любой подстроке
+        product = self.product('Smartphone')
+        self.assertEqual(list(self.search('phone')), [])
+        cache.clear()
+        with mock.patch.object(search, '_available', False):
+            self.assertEqual([p.id for p in self.search('phone')], [product.id])
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create(username='seller')
+        self.buyer = CustomUser.objects.create(username='buyer')
+        self.rival = CustomUser.objects.create(username='rival')
+        self.product = Product.objects.create(
+            author=self.seller, category=Category.objects.create(name='phones'), title='Phone',
+            description='d', price=Decimal('10'), address='a', phone_number='1', tg_username='t', count=5,
+        )
+
+    def test_available_stock_excludes_own_holds(self):
+        inventory.place_hold(self.buyer, self.product, 3)
+        self.assertEqual(inventory.available_stock(self.product, self.buyer), 5)
+        self.assertEqual(inventory.available_stock(self.product, self.rival), 2)
+        self.assertEqual(inventory.available_stock(self.product), 2)
+
+    def test_hold_is_upserted(self):
+        inventory.place_hold(self.buyer, self.product, 1)
+        inventory.place_hold(self.buyer, self.product, 4)
+        self.assertEqual(StockHold.objects.get().quantity, 4)
+        self.assertEqual(inventory.available_stock(self.product, self.rival), 1)
+
+    def test_hold_expires(self):
+        inventory.place_hold(self.buyer, self.product, 3)
+        later = timezone.now() + timedelta(seconds=inventory.HOLD_TTL + 1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(inventory.available_stock(self.product, self.rival), 5)
 
-# Create your tests here.
+    def test_sweep_expired_keeps_live_holds(self):
+        for user in (self.buyer, self.rival, self.seller):
+            inventory.place_hold(user, self.product, 1)
+        StockHold.objects.exclude(user=self.seller).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(inventory.sweep_expired(batch_size=1), 2)
+        self.assertEqual(list(StockHold.objects.values_list('user', flat=True)), [self.seller.id])
+        self.assertEqual(inventory.sweep_expired(), 0)
@@ -20,3 +20,13 @@ urlpatterns = [
     path("<int:product_id>/comment/<int:comment_id>/delete", delete_comment, name='comment_delete'),
     path("<int:product_id>/add-image", add_product_image, name='add_image'),
 ]
+
+query_budgets = {
+    'new': (4, 7),
+    'detail': (11, 15),
+    'update': (5, 9),
+    'delete': (4, 8),
+    'comment_new': 8,
+    'comment_delete': 8,
+    'add_image': 8,
+}
@@ -2,9 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import F
 
+from main.pagecache import anonymous_page_cache
 from .forms import NewProductForm, ProductForm
 from .models import Product, ProductImage, Comment
+from .inventory import available_stock, held_quantities
 
 
 @login_required(login_url='login')
@@ -23,6 +27,7 @@ def new_product(request):
             product = form.save()
             for img in [img1, img2, img3]:
                 ProductImage.objects.create(product=product, image=img)
+            product.update_cover()
             messages.success(request, 'Продукт создан!')
             return redirect('main:index')
     else:
@@ -31,7 +36,27 @@ def new_product(request):
 
 
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    response = _product_detail_page(request, product_id)
+
+    # Recently viewed — вне кэша страницы, чтобы учитывались и закэшированные просмотры
+    recently_viewed = request.session.get('recently_viewed', [])
+    if product_id in recently_viewed:
+        recently_viewed.remove(product_id)
+    recently_viewed.insert(0, product_id)
+    request.session['recently_viewed'] = recently_viewed[:5] # Храним только последние 5
+
+    return response
+
+
+def _held_now(request, product_id):
+    # резервы меняются без сброса штампа каталога — учитываем их в ключе страницы
+    return held_quantities([product_id]).get(product_id, 0)
+
+
+@anonymous_page_cache(vary=_held_now)
+def _product_detail_page(request, product_id):
+    product = get_object_or_404(Product.objects.select_related('author', 'category'), id=product_id)
+    comments = product.comments.select_related('author')
 
     # Проверка на комментарий
     already_rated = False
@@ -45,15 +70,10 @@ def product_detail(request, product_id):
         discount_amount = (product.price * discount_percent) / 100
         discounted_price = product.price - discount_amount
 
-    # Recently viewed
-    recently_viewed = request.session.get('recently_viewed', [])
-    if product.id in recently_viewed:
-        recently_viewed.remove(product.id)
-    recently_viewed.insert(0, product.id)
-    request.session['recently_viewed'] = recently_viewed[:5] # Храним только последние 5
-
     return render(request, 'product_detail.html', {
         'product': product,
+        'available': available_stock(product, request.user),
+        'comments': comments,
         'already_rated': already_rated,
         'discount_percent': discount_percent,
         'discounted_price': discounted_price
@@ -67,6 +87,8 @@ def add_product_image(request, product_id):
         images = request.FILES.getlist('images')
         for img in images:
             ProductImage.objects.create(product=product, image=img)
+        if images and not product.cover:
+            product.update_cover()
         messages.success(request, 'Фото добавлено!')
     return redirect('products:detail', product_id=product.id)
 
@@ -98,6 +120,7 @@ def product_update(request, product_id):
                 # Создаем новые записи
                 for img in [img1, img2, img3]:
                     ProductImage.objects.create(product=product, image=img)
+                product.update_cover()
                 messages.success(request, 'Product and all images updated!')
             else:
                 messages.success(request, 'Product details updated (images remained the same).')
@@ -142,8 +165,10 @@ def new_comment(request, product_id):
         # Получаем рейтинг, если его нет в POST — ставим 0
         rating = request.POST.get('rating', 0)
 
-        # Если пришла пустая строка из формы, тоже превращаем в 0
-        if not rating:
+        # Пустая строка или не число — тоже 0
+        try:
+            rating = int(rating or 0)
+        except ValueError:
             rating = 0
 
         # Проверяем, был ли уже отзыв с рейтингом > 0
@@ -159,17 +184,22 @@ def new_comment(request, product_id):
             )
             messages.info(request, 'Ваш дополнительный комментарий добавлен.')
         else:
-            # Если это первый раз и рейтинга нет — это ошибка
-            if int(rating) == 0:
+            # Если это первый раз и рейтинга нет (или он вне 1..5, как в форме) — это ошибка
+            if not 1 <= rating <= 5:
                 messages.error(request, 'Пожалуйста, выберите оценку при первом отзыве.')
                 return redirect('products:detail', product_id=product.id)
 
-            Comment.objects.create(
-                author=request.user,
-                product=product,
-                body=body,
-                rating=rating
-            )
+            with transaction.atomic():
+                Comment.objects.create(
+                    author=request.user,
+                    product=product,
+                    body=body,
+                    rating=rating
+                )
+                Product.objects.filter(id=product.id).update(
+                    rating_sum=F('rating_sum') + rating,
+                    rating_count=F('rating_count') + 1
+                )
             messages.success(request, 'Ваш отзыв принят!')
 
         return redirect('products:detail', product_id=product.id)
@@ -181,7 +211,13 @@ def delete_comment(request, product_id, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
 
     if request.user == comment.author:
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
+            if comment.rating > 0:
+                Product.objects.filter(id=comment.product_id).update(
+                    rating_sum=F('rating_sum') - comment.rating,
+                    rating_count=F('rating_count') - 1
+                )
         messages.success(request, 'Comment deleted')
 
     return redirect('products:detail', product_id)
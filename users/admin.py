@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
-from .models import CustomUser, Saved, Transaction, PromoCode
+from .models import CustomUser, Saved, Transaction, PromoCode, LedgerEntry
+from . import ledger
 from decimal import Decimal
 
 
@@ -18,6 +19,13 @@ admin.site.register(Saved)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ['user', 'amount', 'created_at', 'is_confirmed']
     fields = ['user', 'amount', 'is_confirmed']
+    list_filter = ['is_confirmed']
+    actions = ['confirm_selected']
+
+    @admin.action(description='Подтвердить выбранные пополнения')
+    def confirm_selected(self, request, queryset):
+        confirmed = ledger.confirm_deposits(queryset.values_list('id', flat=True))
+        self.message_user(request, f'Подтверждено пополнений: {confirmed}')
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -29,17 +37,36 @@ class TransactionAdmin(admin.ModelAdmin):
         return form
 
     def save_model(self, request, obj, form, change):
-        # Начисляем деньги только при подтверждении
+        # Начисляем деньги только при подтверждении и только один раз:
+        # снятая и снова поставленная галочка второй записи в журнал не даёт
         if change and obj.is_confirmed:
             old_obj = Transaction.objects.filter(pk=obj.pk).first()
-            if old_obj and not old_obj.is_confirmed:
-                user = obj.user
-                user.balance += obj.amount
-                user.save()
+            if old_obj and not old_obj.is_confirmed and not LedgerEntry.objects.filter(transaction=obj).exists():
+                super().save_model(request, obj, form, change)
+                ledger.credit(obj.user, obj.amount, deposit=obj)
+                return
 
         super().save_model(request, obj, form, change)
 
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    # Журнал только для чтения: исправления — новой записью, не правкой
+    list_display = ('user', 'amount', 'kind', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('user__username',)
+    ordering = ('-id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(PromoCode)
 class PromoCodeAdmin(admin.ModelAdmin):
     list_display = ('code', 'discount_percentage', 'is_active', 'valid_until')
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BlockedUser
+
+BLOCKS_TIMEOUT = 24 * 60 * 60
+
+
+def _key(user_id):
+    return f'blocks:{user_id}'
+
+
+def block_sets(user_id):
+    """
+    (кого заблокировал user, кто заблокировал user) — два frozenset из кэша;
+    при промахе один запрос по обоим направлениям.
+    """
+    sets = cache.get(_key(user_id))
+    if sets is None:
+        blocking, blocked_by = set(), set()
+        pairs = BlockedUser.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)).values_list(
+            'blocker_id', 'blocked_id'
+        )
+        for blocker_id, blocked_id in pairs:
+            if blocker_id == user_id:
+                blocking.add(blocked_id)
+            if blocked_id == user_id:
+                blocked_by.add(blocker_id)
+        sets = (frozenset(blocking), frozenset(blocked_by))
+        cache.set(_key(user_id), sets, BLOCKS_TIMEOUT)
+    return sets
+
+
+def _invalidate(*user_ids):
+    keys = [_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def block(user, target):
+    BlockedUser.objects.get_or_create(blocker=user, blocked=target)
+    _invalidate(user.id, target.id)
+
+
+def unblock(user, target):
+    BlockedUser.objects.filter(blocker=user, blocked=target).delete()
+    _invalidate(user.id, target.id)
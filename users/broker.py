@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    """
+    Pub/sub внутри одного процесса: подписчик — asyncio.Queue в своём event
+    loop, публикация потокобезопасна (синхронные вьюхи работают в потоках).
+    Для нескольких воркеров подставить брокер с тем же интерфейсом
+    (publish/subscribe/unsubscribe) поверх общего сервиса через настройку CHAT_BROKER.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue, event):
+        # медленный клиент теряет события, а не память сервера; история есть в БД
+        if not queue.full():
+            queue.put_nowait(event)
+
+    def subscribe(self, channel):
+        """Подписка из event loop; события — await subscription.get(), в конце — close()."""
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription.key)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel, set())
+            subscribers.discard(subscription.key)
+            if not subscribers:
+                self._subscribers.pop(subscription.channel, None)
+
+
+class Subscription:
+    def __init__(self, broker, channel, loop, queue):
+        self.broker = broker
+        self.channel = channel
+        self.key = (loop, queue)
+        self.queue = queue
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'CHAT_BROKER', 'users.broker.InProcessBroker'))()
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
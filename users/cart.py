@@ -0,0 +1,69 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from products.inventory import held_quantities
+from products.models import Product
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+
+
+def cart_size(cart):
+    """
+    Число позиций для бейджа в шапке — только из сессии, без запросов.
+
+    Намеренно не PricedCart: удалённый товар считается в бейдже, пока
+    cart_view не разрешит корзину и не уберёт его из сессии.
+    """
+    return len(cart)
+
+
+class CartLine:
+    def __init__(self, product, quantity, held_by_others=0):
+        self.product = product
+        self.quantity = quantity
+        self.subtotal = product.price * quantity
+        self.available = max(product.count - held_by_others, 0)
+
+    @property
+    def in_stock(self):
+        return self.available >= self.quantity
+
+
+class PricedCart:
+    """
+    Корзина из сессии ({'product_id': quantity}), разрешённая одним
+    in_bulk-запросом: позиции, пропавшие товары, нехватка остатка и итоги.
+    Если передан user, остаток считается за вычетом чужих резервов (+1 запрос).
+    """
+
+    def __init__(self, cart, discount_percent=0, user=None):
+        quantities = {int(product_id): int(quantity) for product_id, quantity in cart.items()}
+        products = Product.objects.in_bulk(list(quantities))
+        held = held_quantities(list(products), exclude_user=user) if user is not None and products else {}
+
+        self.lines = [
+            CartLine(products[product_id], quantity, held.get(product_id, 0))
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ]
+        self.missing_ids = [product_id for product_id in quantities if product_id not in products]
+        self.out_of_stock = [line for line in self.lines if not line.in_stock]
+
+        self.discount_percent = discount_percent
+        self.subtotal = _money(sum((line.subtotal for line in self.lines), Decimal('0')))
+        self.discount_amount = _money(self.subtotal * discount_percent / 100)
+        self.total = self.subtotal - self.discount_amount
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def line_price(self, line):
+        """Цена строки с учётом скидки (для истории заказов)."""
+        return _money(line.subtotal * (100 - self.discount_percent) / 100)
+
+    def as_session_cart(self):
+        return {str(line.product.id): line.quantity for line in self.lines}
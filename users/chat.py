@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, PositiveIntegerField, Q, Sum, When
+from django.utils import timezone
+
+from main.pagination import KeysetPage, decode_cursor, encode_cursor
+from .broker import get_broker, user_channel
+from .models import ArchivedMessage, Conversation, Message
+
+PREVIEW_LENGTH = 200
+HISTORY_PAGE_SIZE = 50
+# комментарий-пинг, чтобы прокси не закрывали простаивающий стрим
+HEARTBEAT = 25
+UNREAD_TIMEOUT = 24 * 60 * 60
+
+
+@transaction.atomic
+def record_message(sender, recipient, text):
+    """
+    Сохраняет сообщение и обновляет сводки обеих сторон: у отправителя —
+    последнее сообщение, у получателя — ещё и +1 непрочитанное. Всегда три
+    запроса, сколько бы сообщений ни было в диалоге.
+    """
+    message = Message.objects.create(sender=sender, recipient=recipient, text=text)
+    Conversation.objects.bulk_create(
+        [Conversation(owner=sender, other=recipient), Conversation(owner=recipient, other=sender)],
+        ignore_conflicts=True,
+    )
+    Conversation.objects.filter(
+        Q(owner=sender, other=recipient) | Q(owner=recipient, other=sender)
+    ).update(
+        last_text=text[:PREVIEW_LENGTH],
+        last_sent_by_owner=Case(When(owner=sender, then=True), default=False, output_field=BooleanField()),
+        last_message_at=message.created_at,
+        unread_count=Case(
+            When(owner=recipient, then=F('unread_count') + 1),
+            default=F('unread_count'),
+            output_field=PositiveIntegerField(),
+        ),
+    )
+
+    # живая доставка обоим (у отправителя могут быть открыты другие вкладки)
+    event = message_event(message)
+    transaction.on_commit(lambda: publish(event, sender.id, recipient.id))
+    transaction.on_commit(lambda: _adjust_unread(recipient.id, 1))
+    return message
+
+
+def message_event(message):
+    return {
+        'type': 'message',
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'recipient_id': message.recipient_id,
+        'text': message.text,
+        'time': timezone.localtime(message.created_at).strftime('%H:%M'),
+    }
+
+
+def publish(event, *user_ids):
+    broker = get_broker()
+    for user_id in user_ids:
+        broker.publish(user_channel(user_id), event)
+
+
+def mark_read(user, other):
+    """Помечает прочитанными сообщения от other и обнуляет счётчик в сводке user."""
+    with transaction.atomic():
+        read = Message.objects.filter(sender=other, recipient=user, is_read=False).update(is_read=True)
+        if read:
+            Conversation.objects.filter(owner=user, other=other).update(unread_count=0)
+            # отчёт о прочтении — отправителю
+            event = {'type': 'read', 'reader_id': user.id}
+            transaction.on_commit(lambda: publish(event, other.id))
+            transaction.on_commit(lambda: _adjust_unread(user.id, -read))
+    return read
+
+
+def _unread_key(user_id):
+    return f'unread:{user_id}'
+
+
+def unread_count(user):
+    """Сколько всего непрочитанных у user — для бейджа в шапке; запрос только при промахе кэша."""
+    count = cache.get(_unread_key(user.id))
+    if count is None:
+        count = Conversation.objects.filter(owner=user).aggregate(total=Sum('unread_count'))['total'] or 0
+        cache.set(_unread_key(user.id), count, UNREAD_TIMEOUT)
+    return max(count, 0)
+
+
+def _adjust_unread(user_id, delta):
+    try:
+        cache.incr(_unread_key(user_id), delta)
+    except ValueError:
+        pass  # ключа нет — посчитается при следующем показе
+
+
+def reset_unread(user_ids):
+    cache.delete_many([_unread_key(user_id) for user_id in user_ids])
+
+
+def history_page(request, user, other):
+    """
+    Страница переписки от новых к старым по id (курсор ?cursor=): диапазон
+    по индексу (conversation_key, -id) с LIMIT, так что длинный диалог
+    открывается так же быстро, как новый. Когда горячие сообщения кончились,
+    страница дочитывается из архива — у диалога архив всегда старше горячих.
+    """
+    key = Message.key_for(user.id, other.id)
+    position = decode_cursor(request.GET.get('cursor'), '-id')
+    before = position[1] if position else None
+
+    items = []
+    for model in (Message, ArchivedMessage):
+        rows = model.objects.filter(conversation_key=key)
+        if before is not None:
+            rows = rows.filter(id__lt=before)
+        items += rows.order_by('-id')[:HISTORY_PAGE_SIZE + 1 - len(items)]
+        if len(items) > HISTORY_PAGE_SIZE:
+            break
+        if items:
+            before = items[-1].id
+
+    next_url = None
+    if len(items) > HISTORY_PAGE_SIZE:
+        items = items[:HISTORY_PAGE_SIZE]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor('-id', items[-1].id, items[-1].id)
+        next_url = '?' + query.urlencode()
+    return KeysetPage(items, next_url)
+
+
+async def event_stream(user_id):
+    """SSE-поток событий пользователя из брокера; соединение держит корутина, не поток."""
+    subscription = get_broker().subscribe(user_channel(user_id))
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
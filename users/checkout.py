@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Case, When, F, Q, PositiveIntegerField
+
+from main import pagecache
+from products.inventory import release_holds
+from products.models import Product
+from . import ledger
+from .cart import PricedCart
+from .models import Order
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class ProductUnavailable(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, product):
+        super().__init__(product)
+        self.product = product
+
+
+class _StockChanged(Exception):
+    pass
+
+
+class InsufficientFunds(CheckoutError):
+    def __init__(self, required):
+        super().__init__(required)
+        self.required = required
+
+
+def place_order(user, lines, discount_percent=0):
+    """
+    Покупка {product_id: quantity} одной транзакцией: один SELECT товаров
+    (PricedCart), один условный UPDATE остатков, одна запись в журнал
+    баланса и один bulk INSERT заказов — независимо от размера корзины.
+
+    Остаток проверяется в самом UPDATE (count >= qty), баланс — под блокировкой
+    журнала пользователя, поэтому параллельные покупатели не могут уйти в минус. При любой ошибке
+    транзакция откатывается целиком.
+
+    Возвращает (orders, total, discount_amount).
+    """
+    lines = {int(product_id): int(quantity) for product_id, quantity in lines.items()}
+    if not lines or min(lines.values()) < 1:
+        raise CheckoutError('Invalid quantity.')
+
+    try:
+        with transaction.atomic():
+            cart = PricedCart(lines, discount_percent, user=user)
+            if cart.missing_ids:
+                raise ProductUnavailable()
+            if cart.out_of_stock:
+                raise OutOfStock(cart.out_of_stock[0].product)
+            total = cart.total
+
+            # 1. Остатки: строка обновится, только если товара хватает с учётом чужих резервов
+            in_stock = Q()
+            for line in cart:
+                reserved = line.product.count - line.available
+                in_stock |= Q(id=line.product.id, count__gte=line.quantity + reserved)
+            updated = Product.objects.filter(in_stock).update(count=Case(
+                *[When(id=pk, then=F('count') - quantity) for pk, quantity in lines.items()],
+                output_field=PositiveIntegerField(),
+            ))
+            if updated != len(lines):
+                # остаток успели выкупить между чтением и UPDATE
+                raise _StockChanged()
+
+            # 2. Баланс: одна запись в журнал, если хватает средств
+            if not ledger.debit(user, total):
+                raise InsufficientFunds(total)
+
+            # Свои резервы превращаются в продажу
+            release_holds(user, list(lines))
+
+            # 3. Заказы; цена строки — пропорционально скидке
+            orders = Order.objects.bulk_create([
+                Order(user=user, product=line.product, price=cart.line_price(line), quantity=line.quantity)
+                for line in cart
+            ])
+            transaction.on_commit(pagecache.invalidate)
+    except _StockChanged:
+        # транзакция уже откатилась — перечитываем, какого товара теперь не хватает
+        cart = PricedCart(lines, user=user)
+        if cart.missing_ids:
+            raise ProductUnavailable() from None
+        short = cart.out_of_stock[0] if cart.out_of_stock else cart.lines[0]
+        raise OutOfStock(short.product) from None
+
+    return orders, total, cart.discount_amount
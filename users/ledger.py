@@ -0,0 +1,133 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import CustomUser, LedgerEntry, BalanceSnapshot, Transaction
+
+# Новый снимок баланса — после стольких записей с предыдущего
+SNAPSHOT_EVERY = 50
+BALANCE_TIMEOUT = 600
+
+
+def _cache_key(user_id):
+    return f'balance:{user_id}'
+
+
+def _current(user_id):
+    """
+    (баланс, записей после снимка): последний снимок + сумма хвоста журнала.
+    Оба запроса идут по индексам (user, last_entry) и (user, id), а хвост
+    не длиннее SNAPSHOT_EVERY записей.
+    """
+    snapshot = (
+        BalanceSnapshot.objects.filter(user_id=user_id)
+        .order_by('-last_entry_id')
+        .values_list('last_entry_id', 'balance')
+        .first()
+    )
+    last_entry_id, balance = snapshot or (0, Decimal('0.00'))
+    tail = LedgerEntry.objects.filter(user_id=user_id, id__gt=last_entry_id).aggregate(
+        total=Sum('amount'), count=Count('id')
+    )
+    return balance + (tail['total'] or 0), tail['count']
+
+
+def get_balance(user):
+    """Баланс для показа (шапка, профиль): из кэша, при промахе — по журналу."""
+    balance = cache.get(_cache_key(user.id))
+    if balance is None:
+        balance, _ = _current(user.id)
+        cache.set(_cache_key(user.id), balance, BALANCE_TIMEOUT)
+    return balance
+
+
+def _lock(user_id):
+    # Сериализует записи журнала одного пользователя; сама строка не меняется.
+    # В SQLite то же самое даёт IMMEDIATE-транзакция.
+    list(CustomUser.objects.select_for_update().filter(id=user_id).values_list('id'))
+
+
+def _append(user_id, amount, kind, balance, since_snapshot, **fields):
+    entry = LedgerEntry.objects.create(user_id=user_id, amount=amount, kind=kind, **fields)
+    if since_snapshot + 1 >= SNAPSHOT_EVERY:
+        BalanceSnapshot.objects.create(user_id=user_id, last_entry=entry, balance=balance)
+
+    cache.delete(_cache_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+    return entry
+
+
+@transaction.atomic(savepoint=False)
+def credit(user, amount, kind=LedgerEntry.DEPOSIT, deposit=None):
+    """Зачисление; deposit — подтверждённая заявка Transaction (не больше одного раза)."""
+    _lock(user.id)
+    balance, since_snapshot = _current(user.id)
+    return _append(user.id, amount, kind, balance + amount, since_snapshot, transaction=deposit)
+
+
+@transaction.atomic(savepoint=False)
+def debit(user, amount, kind=LedgerEntry.PURCHASE):
+    """Списание, если хватает средств. Возвращает запись журнала или None."""
+    _lock(user.id)
+    balance, since_snapshot = _current(user.id)
+    if balance < amount:
+        return None
+    return _append(user.id, -amount, kind, balance - amount, since_snapshot)
+
+
+def _snapshot_long_tails(user_ids):
+    """Снимки для тех из user_ids, у кого хвост журнала дорос до SNAPSHOT_EVERY (два GROUP BY)."""
+    latest = BalanceSnapshot.objects.filter(user_id=OuterRef('user_id')).order_by('-last_entry_id')
+    tails = (
+        LedgerEntry.objects.filter(user_id__in=user_ids)
+        .annotate(since=Coalesce(Subquery(latest.values('last_entry_id')[:1]), 0))
+        .filter(id__gt=F('since'))
+        .values('user_id')
+        .annotate(total=Sum('amount'), count=Count('id'), last=Max('id'))
+        .filter(count__gte=SNAPSHOT_EVERY)
+    )
+    tails = {row['user_id']: row for row in tails}
+    if not tails:
+        return
+    latest = BalanceSnapshot.objects.filter(user_id=OuterRef('id')).order_by('-last_entry_id')
+    bases = CustomUser.objects.filter(id__in=list(tails)).annotate(
+        base=Coalesce(Subquery(latest.values('balance')[:1]), Decimal('0.00'), output_field=DecimalField())
+    ).values_list('id', 'base')
+    BalanceSnapshot.objects.bulk_create([
+        BalanceSnapshot(user_id=user_id, last_entry_id=tails[user_id]['last'], balance=base + tails[user_id]['total'])
+        for user_id, base in bases
+    ])
+
+
+def confirm_deposits(transaction_ids):
+    """
+    Подтверждает пачку заявок на пополнение одной транзакцией: один UPDATE
+    is_confirmed (только ещё не зачисленные), один bulk INSERT журнала и
+    снимки для пользователей с длинным хвостом. Возвращает число подтверждённых.
+    """
+    with transaction.atomic():
+        # ledger_entry__isnull — уже зачисленные (галочку сняли и поставили снова) не трогаем
+        pending = list(
+            Transaction.objects.select_for_update(of=('self',))
+            .filter(id__in=list(transaction_ids), is_confirmed=False, ledger_entry__isnull=True)
+            .values_list('id', 'user_id', 'amount')
+        )
+        if not pending:
+            return 0
+        user_ids = {user_id for _, user_id, _ in pending}
+        list(CustomUser.objects.select_for_update().filter(id__in=user_ids).values_list('id'))
+
+        Transaction.objects.filter(id__in=[pk for pk, _, _ in pending]).update(is_confirmed=True)
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(user_id=user_id, amount=amount, kind=LedgerEntry.DEPOSIT, transaction_id=pk)
+            for pk, user_id, amount in pending
+        ])
+        _snapshot_long_tails(user_ids)
+
+        keys = [_cache_key(user_id) for user_id in user_ids]
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+    return len(pending)
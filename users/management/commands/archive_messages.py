@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import ArchivedMessage, Message
+
+FIELDS = ['id', 'sender_id', 'recipient_id', 'text', 'is_read', 'created_at', 'conversation_key']
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит сообщения старше --days в архивную таблицу пачками. Диалоги, где '
+        'среди старых сообщений есть непрочитанные, пропускаются целиком — так архив '
+        'каждого диалога всегда старше его горячей части, а счётчики непрочитанных не меняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHAT_ARCHIVE_AFTER_DAYS', 180))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0, help='секунд между пачками')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old = Message.objects.filter(created_at__lt=cutoff)
+        candidates = old.exclude(
+            conversation_key__in=old.filter(is_read=False).values('conversation_key')
+        ).order_by('id')
+
+        archived = 0
+        while True:
+            batch = list(candidates.values(*FIELDS)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                # ignore_conflicts — повторный запуск после сбоя не падает на уже скопированных
+                ArchivedMessage.objects.bulk_create([ArchivedMessage(**row) for row in batch], ignore_conflicts=True)
+                Message.objects.filter(id__in=[row['id'] for row in batch]).delete()
+            archived += len(batch)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(f'Messages archived: {archived}')
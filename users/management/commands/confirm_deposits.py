@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.ledger import confirm_deposits
+from users.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Подтверждает заявки на пополнение пачками: по одной транзакции БД на пачку.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='id заявок Transaction')
+        parser.add_argument('--all', action='store_true', help='все неподтверждённые заявки')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            ids = list(Transaction.objects.filter(is_confirmed=False).order_by('id').values_list('id', flat=True))
+        elif options['ids']:
+            ids = options['ids']
+        else:
+            raise CommandError('Pass transaction ids or --all.')
+
+        confirmed = 0
+        size = options['batch_size']
+        for start in range(0, len(ids), size):
+            confirmed += confirm_deposits(ids[start:start + size])
+        self.stdout.write(f'Deposits confirmed: {confirmed} of {len(ids)}')
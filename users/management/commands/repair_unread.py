@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users.chat import reset_unread
+from users.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики непрочитанных в сводках диалогов по самим сообщениям и сбрасывает их кэш.'
+
+    def handle(self, *args, **options):
+        unread = (
+            Message.objects.filter(recipient=OuterRef('owner'), sender=OuterRef('other'), is_read=False)
+            .order_by()
+            .values('recipient')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        drifted = Conversation.objects.exclude(unread_count=Coalesce(Subquery(unread), Value(0)))
+        fixed = drifted.update(unread_count=Coalesce(Subquery(unread), Value(0)))
+
+        # кэш мог разойтись и без расхождения в таблице — сбрасываем всем владельцам сводок
+        reset_unread(Conversation.objects.values_list('owner_id', flat=True).distinct())
+        self.stdout.write(f'Conversations fixed: {fixed}')
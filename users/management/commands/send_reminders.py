@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.reminders import BATCH_SIZE, process_due
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает наступившие напоминания пачками, начиная с отметки прошлого '
+        'прогона. С --loop работает как воркер: повторяет прогон каждые N секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', type=float, default=0, help='секунд между прогонами (0 — один прогон)')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_due(batch_size=options['batch_size'])
+            rate = stats['processed'] / stats['seconds'] if stats['seconds'] else 0
+            self.stdout.write(
+                f"Reminders processed: {stats['processed']}, emailed: {stats['sent']}, "
+                f"batches: {stats['batches']}, {stats['seconds']:.2f}s ({rate:.0f}/s)"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from products.models import Category, Product
+from users import ledger
+from users.models import CustomUser, LedgerEntry, Order
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест покупки: много параллельных покупателей бьют в buy_now / checkout_all '
+        'на локальной БД. Печатает пропускную способность, p50/p99 и нарушения инвариантов '
+        '(перепродажа остатка, потерянные списания баланса, дубли заказов).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['buy_now', 'checkout', 'mixed'], default='mixed')
+        parser.add_argument('--buyers', type=int, default=20)
+        parser.add_argument('--attempts', type=int, default=5, help='покупок на одного покупателя')
+        parser.add_argument('--stock', type=int, default=30, help='остаток каждого товара')
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--price', type=Decimal, default=Decimal('10.00'))
+        parser.add_argument('--balance', type=Decimal, default=Decimal('50.00'))
+        parser.add_argument('--keep', action='store_true', help='не удалять тестовые данные')
+
+    def handle(self, *args, **options):
+        tag = f'stress-{uuid.uuid4().hex[:8]}'
+        seller, category, products, buyers = self._setup(tag, options)
+        try:
+            # 500-ки считаем сами, трейсбеки django.request в консоли не нужны
+            request_logger = logging.getLogger('django.request')
+            previous_level = request_logger.level
+            request_logger.setLevel(logging.CRITICAL)
+            try:
+                with override_settings(ALLOWED_HOSTS=['*']):
+                    results, elapsed = self._run(buyers, products, options)
+            finally:
+                request_logger.setLevel(previous_level)
+            self._report(results, elapsed, products, buyers, options)
+        finally:
+            if not options['keep']:
+                CustomUser.objects.filter(username__startswith=tag).delete()
+                category.delete()
+
+    def _setup(self, tag, options):
+        seller = CustomUser.objects.create_user(f'{tag}-seller', password=tag)
+        category = Category.objects.create(name=tag[:20])
+        products = [
+            Product.objects.create(
+                author=seller, category=category, title=f'{tag} #{i}', description=tag,
+                price=options['price'], address='-', phone_number='-', tg_username='-',
+                count=options['stock'],
+            )
+            for i in range(options['products'])
+        ]
+        buyers = [
+            CustomUser.objects.create_user(f'{tag}-buyer{i}', password=tag)
+            for i in range(options['buyers'])
+        ]
+        for buyer in buyers:
+            ledger.credit(buyer, options['balance'], kind=LedgerEntry.OPENING)
+        return seller, category, products, buyers
+
+    def _run(self, buyers, products, options):
+        barrier = threading.Barrier(len(buyers))
+
+        def worker(index, buyer):
+            client = Client(raise_request_exception=False)
+            client.force_login(buyer)
+            results = []
+            barrier.wait()
+            for attempt in range(options['attempts']):
+                product = products[(index + attempt) % len(products)]
+                checkout = options['mode'] == 'checkout' or (options['mode'] == 'mixed' and attempt % 2)
+                # сколько заказов должна создать успешная покупка: buy_now — 1, checkout — по строке корзины
+                if checkout:
+                    cart = {str(p.id): 1 for p in products[:2]}
+                    session = client.session
+                    session['cart'] = cart
+                    session.save()
+                    url = reverse('users:checkout_all')
+                    orders_per_purchase = len(cart)
+                else:
+                    url = reverse('users:buy_now', args=[product.id])
+                    orders_per_purchase = 1
+
+                started = time.perf_counter()
+                response = client.post(url, {'quantity_hidden': 1})
+                latency = time.perf_counter() - started
+
+                ok = response.status_code == 302 and response.url == reverse('users:orders')
+                results.append((buyer.id, ok, response.status_code >= 500, latency, orders_per_purchase))
+            connections.close_all()
+            return results
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(buyers)) as pool:
+            futures = [pool.submit(worker, i, buyer) for i, buyer in enumerate(buyers)]
+            results = [row for future in futures for row in future.result()]
+        return results, time.perf_counter() - started
+
+    def _report(self, results, elapsed, products, buyers, options):
+        latencies = [latency for _, _, _, latency, _ in results]
+        succeeded = sum(1 for _, ok, _, _, _ in results if ok)
+        errors = sum(1 for _, _, error, _, _ in results if error)
+
+        self.stdout.write(f"requests:    {len(results)} ({succeeded} purchases, {errors} server errors)")
+        self.stdout.write(f"throughput:  {len(results) / elapsed:.1f} req/s over {elapsed:.2f}s")
+        self.stdout.write(
+            f"latency:     p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 99) * 1000:.1f} ms"
+        )
+
+        violations = []
+        for product in products:
+            sold = Order.objects.filter(product=product).aggregate(q=Sum('quantity'))['q'] or 0
+            product.refresh_from_db(fields=['count'])
+            if sold > options['stock'] or product.count != options['stock'] - sold:
+                violations.append(
+                    f'oversell: {product.title} stock {options["stock"]}, sold {sold}, left {product.count}'
+                )
+
+        expected_orders = {}
+        for buyer_id, ok, _, _, orders_per_purchase in results:
+            expected_orders[buyer_id] = expected_orders.get(buyer_id, 0) + (orders_per_purchase if ok else 0)
+        for buyer in buyers:
+            # сверяем по самому журналу, мимо кэша и снимков
+            balance = LedgerEntry.objects.filter(user=buyer).aggregate(s=Sum('amount'))['s']
+            orders = Order.objects.filter(user=buyer)
+            paid = orders.aggregate(s=Sum('price'))['s'] or Decimal('0')
+            if balance < 0 or options['balance'] - balance != paid:
+                violations.append(
+                    f'lost balance update: {buyer.username} paid {paid}, '
+                    f'balance {options["balance"]} -> {balance}'
+                )
+            expected = expected_orders.get(buyer.id, 0)
+            if orders.count() != expected:
+                violations.append(
+                    f'order count: {buyer.username} has {orders.count()} orders, expected {expected}'
+                )
+
+        if violations:
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(violation))
+        else:
+            self.stdout.write(self.style.SUCCESS('invariants:  OK (no oversell, no lost updates, exact order counts)'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:44
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_blockeduser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromoCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True, verbose_name='Промокод')),
+                ('discount_percentage', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)], verbose_name='Скидка (%)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('valid_until', models.DateTimeField(blank=True, null=True, verbose_name='Действует до')),
+            ],
+            options={
+                'verbose_name': 'Промокод',
+                'verbose_name_plural': 'Промокоды',
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def opening_entries(apps, schema_editor):
+    # Текущий баланс каждого пользователя становится первой записью журнала
+    CustomUser = apps.get_model('users', 'CustomUser')
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+    LedgerEntry.objects.bulk_create(
+        [
+            LedgerEntry(user_id=user_id, amount=balance, kind='opening')
+            for user_id, balance in CustomUser.objects.exclude(balance=0).values_list('id', 'balance').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+def restore_balances(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+    totals = LedgerEntry.objects.values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+    for user_id, total in totals.iterator():
+        CustomUser.objects.filter(id=user_id).update(balance=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_promocode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('kind', models.CharField(choices=[('opening', 'Начальный остаток'), ('deposit', 'Пополнение'), ('purchase', 'Покупка')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entry', to='users.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+                ('last_entry', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.ledgerentry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user', 'id'], name='ledger_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['user', 'last_entry'], name='snapshot_user_entry_idx'),
+        ),
+        migrations.RunPython(opening_entries, restore_balances),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='balance',
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def normalize_codes(apps, schema_editor):
+    # Коды хранятся в верхнем регистре; при совпадении после нормализации
+    # оставляем первый код, остальные не трогаем (их найдёт только админка)
+    PromoCode = apps.get_model('users', 'PromoCode')
+    taken = set(PromoCode.objects.values_list('code', flat=True))
+    for promo in PromoCode.objects.order_by('id'):
+        code = promo.code.strip().upper()
+        if code != promo.code and code not in taken:
+            taken.discard(promo.code)
+            taken.add(code)
+            PromoCode.objects.filter(id=promo.id).update(code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_stockhold'),
+        ('users', '0015_promocode_upper'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-date', '-id'], name='order_user_date_idx'),
+        ),
+    ]
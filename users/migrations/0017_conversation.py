@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def fill_conversations(apps, schema_editor):
+    # По паре (отправитель, получатель): id последнего сообщения и число непрочитанных
+    Message = apps.get_model('users', 'Message')
+    Conversation = apps.get_model('users', 'Conversation')
+    pairs = {
+        (row['sender_id'], row['recipient_id']): row
+        for row in Message.objects.values('sender_id', 'recipient_id').annotate(
+            last_id=Max('id'), unread=Count('id', filter=Q(is_read=False))
+        ).order_by()
+    }
+    last_messages = Message.objects.in_bulk([row['last_id'] for row in pairs.values()])
+
+    # у каждой пары две стороны: (owner, other) и (other, owner)
+    sides = {side for sender_id, recipient_id in pairs for side in ((sender_id, recipient_id), (recipient_id, sender_id))}
+    conversations = []
+    for owner_id, other_id in sides:
+        incoming = pairs.get((other_id, owner_id))
+        outgoing = pairs.get((owner_id, other_id))
+        last = last_messages[max(row['last_id'] for row in (incoming, outgoing) if row)]
+        conversations.append(Conversation(
+            owner_id=owner_id,
+            other_id=other_id,
+            last_text=last.text[:200],
+            last_sent_by_owner=last.sender_id == owner_id,
+            last_message_at=last.created_at,
+            unread_count=incoming['unread'] if incoming else 0,
+        ))
+    Conversation.objects.bulk_create(conversations, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_order_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_text', models.CharField(blank=True, max_length=200)),
+                ('last_sent_by_owner', models.BooleanField(default=False)),
+                ('last_message_at', models.DateTimeField(null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-last_message_at'], name='conversation_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'other'), name='unique_conversation')],
+            },
+        ),
+        migrations.RunPython(fill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:57
+
+from django.db import migrations, models
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat, Greatest, Least
+
+
+def fill_keys(apps, schema_editor):
+    Message = apps.get_model('users', 'Message')
+    Message.objects.update(conversation_key=Concat(
+        Cast(Least(F('sender_id'), F('recipient_id')), CharField()),
+        Value(':'),
+        Cast(Greatest(F('sender_id'), F('recipient_id')), CharField()),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='conversation_key',
+            field=models.CharField(default='', editable=False, max_length=41),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation_key', '-id'], name='message_history_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_archivedmessage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['user', 'date'], name='reminder_user_date_idx'),
+        ),
+    ]
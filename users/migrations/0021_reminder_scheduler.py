@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_reminder_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reminder_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['date', 'id'], name='reminder_due_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicates(apps, schema_editor):
+    # Из дублей (author, product) оставляем самую раннюю запись
+    Saved = apps.get_model('users', 'Saved')
+    duplicates = (
+        Saved.objects.values('author_id', 'product_id')
+        .annotate(first=Min('id'), copies=Count('id'))
+        .filter(copies__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        Saved.objects.filter(author_id=row['author_id'], product_id=row['product_id']).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_stockhold'),
+        ('users', '0021_reminder_scheduler'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='saved',
+            constraint=models.UniqueConstraint(fields=('author', 'product'), name='unique_saved'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_saved_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='last_entry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.ledgerentry'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entry', to='users.transaction'),
+        ),
+    ]
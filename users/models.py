@@ -8,17 +8,27 @@ class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=17)
     tg_username = models.CharField(max_length=150)
     avatar = models.ImageField(upload_to='avatars/', default='avatars/default.png')
-    balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
 
     def __str__(self):
         return str(self.username)
 
+    @property
+    def balance(self):
+        # Баланс не хранится в строке пользователя — считается по журналу (users.ledger)
+        from .ledger import get_balance
+        return get_balance(self)
+
 
 class Saved(models.Model):
     product = models.ForeignKey("products.Product", on_delete=models.CASCADE)
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'product'], name='unique_saved'),
+        ]
+
     def __str__(self):
         return "Comment of " + str(self.author.username)
 
@@ -29,10 +39,28 @@ class Reminder(models.Model):
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # календарь: WHERE user = ? AND date >= ? AND date < ?
+            models.Index(fields=['user', 'date'], name='reminder_user_date_idx'),
+            # рассылка: наступившие после отметки, по порядку (date, id)
+            models.Index(fields=['date', 'id'], name='reminder_due_idx'),
+        ]
+
     def __str__(self):
         return f'{self.title} ({self.date})'
 
 
+class ReminderMark(models.Model):
+    """Отметка рассылки (users.reminders): до какого (date, id) напоминания уже обработаны."""
+    date = models.DateField()
+    reminder_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.date} #{self.reminder_id}'
+
+
 
 # ------------------Transaction--------------
 
@@ -56,6 +84,45 @@ class Transaction(models.Model):
         return f"{self.user.username} - {self.amount:.2f}"
 
 
+class LedgerEntry(models.Model):
+    """Журнал движения денег: только вставки, строки не меняются и не удаляются."""
+    OPENING = 'opening'
+    DEPOSIT = 'deposit'
+    PURCHASE = 'purchase'
+    KIND_CHOICES = [
+        (OPENING, 'Начальный остаток'),
+        (DEPOSIT, 'Пополнение'),
+        (PURCHASE, 'Покупка'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='ledger')
+    amount = models.DecimalField(max_digits=15, decimal_places=2)  # > 0 приход, < 0 расход
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # пополнение зачисляется ровно один раз; удаление заявки зачисление не отменяет
+    transaction = models.OneToOneField(
+        Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entry'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='ledger_user_id_idx')]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount:+.2f} ({self.kind})"
+
+
+class BalanceSnapshot(models.Model):
+    """Баланс пользователя на момент записи журнала last_entry включительно."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='balance_snapshots')
+    # производные данные: уходят вместе с записью журнала
+    last_entry = models.ForeignKey(LedgerEntry, on_delete=models.CASCADE, related_name='+')
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'last_entry'], name='snapshot_user_entry_idx')]
+
+
 from decimal import Decimal, ROUND_HALF_UP
 
 class Order(models.Model):
@@ -65,6 +132,11 @@ class Order(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        # история заказов: WHERE user = ? ORDER BY date DESC, id DESC;
+        # price в конце — SUM по более старым заказам читает только индекс
+        indexes = [models.Index(fields=['user', '-date', '-id', 'price'], name='order_user_date_idx')]
+
     def save(self, *args, **kwargs):
         # Округляем до 2 знаков перед попаданием в БД
         if self.price:
@@ -93,16 +165,71 @@ class Message(models.Model):
     text = models.TextField(verbose_name="Текст сообщения")
     is_read = models.BooleanField(default=False, verbose_name="Прочитано")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата отправки")
+    # 'меньший_id:больший_id' — одинаков для обоих направлений переписки
+    conversation_key = models.CharField(max_length=41, default='', editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['conversation_key', '-id'], name='message_history_idx')]
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
 
+    @staticmethod
+    def key_for(user_id, other_id):
+        return f'{min(user_id, other_id)}:{max(user_id, other_id)}'
+
+    def save(self, *args, **kwargs):
+        if not self.conversation_key:
+            self.conversation_key = self.key_for(self.sender_id, self.recipient_id)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"От {self.sender} к {self.recipient} ({self.created_at.strftime('%d.%m %H:%M')})"
 
 
+class ArchivedMessage(models.Model):
+    """
+    Холодное хранилище старых сообщений (manage.py archive_messages).
+    id совпадает с id исходного Message, поэтому история листается по
+    одному курсору через обе таблицы.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    text = models.TextField()
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    conversation_key = models.CharField(max_length=41)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['conversation_key', '-id'], name='archived_history_idx')]
+
+    def __str__(self):
+        return f"{self.sender_id} -> {self.recipient_id} (archived)"
+
+
+
+class Conversation(models.Model):
+    """
+    Сводка диалога для одной стороны (owner): последнее сообщение и сколько
+    у owner непрочитанных от other. На каждую пару — две строки, обновляются
+    при отправке (users.chat.record_message), список чатов читается одним запросом.
+    """
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='conversations')
+    other = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    last_text = models.CharField(max_length=200, blank=True)
+    last_sent_by_owner = models.BooleanField(default=False)
+    last_message_at = models.DateTimeField(null=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['owner', 'other'], name='unique_conversation')]
+        indexes = [models.Index(fields=['owner', '-last_message_at'], name='conversation_inbox_idx')]
+
+    def __str__(self):
+        return f"{self.owner_id} <-> {self.other_id}"
+
 
 class BlockedUser(models.Model):
     blocker = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='blocking')
@@ -126,6 +253,11 @@ class PromoCode(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Активен")
     valid_until = models.DateTimeField(null=True, blank=True, verbose_name="Действует до")
 
+    def save(self, *args, **kwargs):
+        # Храним в верхнем регистре — поиск идёт точным совпадением по уникальному индексу
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.code} (-{self.discount_percentage}%)"
 
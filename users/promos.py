@@ -0,0 +1,39 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from main.registry import VersionedRegistry
+
+from .models import PromoCode
+
+
+def normalize(code):
+    return (code or '').strip().upper()
+
+
+def _load():
+    # {КОД: (скидка %, valid_until)}; перечитываем, когда истекает ближайший valid_until
+    now = timezone.now()
+    promos = PromoCode.objects.filter(
+        Q(valid_until__isnull=True) | Q(valid_until__gt=now), is_active=True
+    ).values_list('code', 'discount_percentage', 'valid_until')
+    codes = {code: (percent, valid_until) for code, percent, valid_until in promos}
+    return codes, min((until for _, until in codes.values() if until), default=None)
+
+
+# Действующие промокоды в памяти процесса; сбрасываются сигналами PromoCode
+_registry = VersionedRegistry('promos:version', _load)
+
+
+def get_discount(code):
+    """Скидка в % по промокоду или 0, если кода нет, он выключен или истёк."""
+    code = normalize(code)
+    if not code:
+        return 0
+    percent, valid_until = _registry.get().get(code, (0, None))
+    if valid_until is not None and valid_until <= timezone.now():
+        return 0
+    return percent
+
+
+def invalidate():
+    _registry.invalidate()
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from products.models import Product
+from .models import Saved
+
+SAVED_TIMEOUT = 60 * 60
+
+
+def _key(user_id):
+    return f'saved:{user_id}'
+
+
+def saved_ids(user_id):
+    """id сохранённых товаров user — frozenset из кэша; при промахе один запрос по author."""
+    ids = cache.get(_key(user_id))
+    if ids is None:
+        ids = frozenset(Saved.objects.filter(author_id=user_id).values_list('product_id', flat=True))
+        cache.set(_key(user_id), ids, SAVED_TIMEOUT)
+    return ids
+
+
+def _invalidate(user_id):
+    cache.delete(_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def toggle(user, product_id):
+    """
+    Убирает товар из сохранённых, а если его там не было — добавляет.
+    Удаление — один DELETE; добавление — проверка товара по PK и INSERT,
+    который на уникальности (author, product) ничего не делает, так что
+    двойной клик не создаёт дубль. Возвращает True, если товар теперь сохранён.
+    """
+    deleted, _ = Saved.objects.filter(author=user, product_id=product_id).delete()
+    if not deleted:
+        if not Product.objects.filter(id=product_id).exists():
+            raise Product.DoesNotExist
+        Saved.objects.bulk_create([Saved(author=user, product_id=product_id)], ignore_conflicts=True)
+    _invalidate(user.id)
+    return not deleted
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import PromoCode
+from . import promos
+
+
+@receiver([post_save, post_delete], sender=PromoCode)
+def promo_changed(sender, **kwargs):
+    promos.invalidate()
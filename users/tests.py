@@ -1,3 +1,284 @@
-from django.test import TestCase
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from products.inventory import place_hold
+from products.models import Category, Product, StockHold
+from users import chat, checkout, ledger, promos, reminders, saved
+from users.models import (
+    ArchivedMessage, BalanceSnapshot, CustomUser, LedgerEntry, Message, Order, PromoCode, Reminder, Saved,
+    Transaction,
+)
+from users.management.commands.archive_messages import FIELDS as ARCHIVE_FIELDS
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = CustomUser.objects.create(username='buyer')
+        self.rival = CustomUser.objects.create(username='rival')
+        for user in (self.buyer, self.rival):
+            ledger.credit(user, Decimal('100'), kind=LedgerEntry.OPENING)
+        self.seller = CustomUser.objects.create(username='seller')
+        self.category = Category.objects.create(name='phones')
+
+    def product(self, price='10', count=5):
+        return Product.objects.create(
+            author=self.seller, category=self.category, title='Phone', description='d',
+            price=Decimal(price), address='a', phone_number='1', tg_username='t', count=count,
+        )
+
+    def test_insufficient_balance_rolls_back_stock(self):
+        product = self.product(price='60', count=5)
+        with self.assertRaises(checkout.InsufficientFunds):
+            checkout.place_order(self.buyer, {product.id: 2})
+        product.refresh_from_db()
+        self.assertEqual(product.count, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(ledger.get_balance(self.buyer), Decimal('100'))
+
+    def test_last_unit_is_not_oversold(self):
+        product = self.product(count=1)
+        read_cart = checkout.PricedCart
+        reads = []
+
+        def rival_buys_after_read(*args, **kwargs):
+            # соперник покупает последнюю штуку между чтением корзины и UPDATE остатка
+            cart = read_cart(*args, **kwargs)
+            if not reads:
+                with mock.patch.object(checkout, 'PricedCart', read_cart):
+                    checkout.place_order(self.rival, {product.id: 1})
+            reads.append(cart)
+            return cart
+
+        with mock.patch.object(checkout, 'PricedCart', rival_buys_after_read):
+            with self.assertRaises(checkout.OutOfStock) as raised:
+                checkout.place_order(self.buyer, {product.id: 1})
+        self.assertEqual(raised.exception.product, product)
+        # в тесте одно соединение: откат покупателя откатил и покупку соперника,
+        # но списания покупателя не было — ни заказа, ни денег, ни минуса на складе
+        product.refresh_from_db()
+        self.assertEqual(product.count, 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(ledger.get_balance(self.buyer), Decimal('100'))
+
+    def test_discounted_order_prices(self):
+        cheap, dear = self.product(price='10'), self.product(price='15')
+        orders, total, discount = checkout.place_order(self.buyer, {cheap.id: 1, dear.id: 2}, discount_percent=10)
+        self.assertEqual((total, discount), (Decimal('36.00'), Decimal('4.00')))
+        self.assertEqual(
+            sorted((order.product_id, order.quantity, order.price) for order in orders),
+            [(cheap.id, 1, Decimal('9.00')), (dear.id, 2, Decimal('27.00'))],
+        )
+        self.assertEqual(ledger.get_balance(self.buyer), Decimal('64.00'))
+
+    def test_checkout_releases_own_holds(self):
+        product = self.product(count=3)
+        place_hold(self.buyer, product, 2)
+        place_hold(self.rival, product, 1)
+        checkout.place_order(self.buyer, {product.id: 2})
+        self.assertEqual(list(StockHold.objects.values_list('user', flat=True)), [self.rival.id])
+        product.refresh_from_db()
+        self.assertEqual(product.count, 1)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='buyer')
+
+    def entries_total(self):
+        return sum(LedgerEntry.objects.filter(user=self.user).values_list('amount', flat=True))
+
+    def test_snapshot_plus_tail_equals_entries(self):
+        for i in range(ledger.SNAPSHOT_EVERY * 2 + 7):
+            ledger.credit(self.user, Decimal('3'))
+            if i % 3 == 0:
+                ledger.debit(self.user, Decimal('2'))
+        self.assertGreaterEqual(BalanceSnapshot.objects.filter(user=self.user).count(), 2)
+        balance, since_snapshot = ledger._current(self.user.id)
+        self.assertLess(since_snapshot, ledger.SNAPSHOT_EVERY)
+        self.assertEqual(balance, self.entries_total())
+        self.assertEqual(ledger.get_balance(self.user), balance)
+
+    def test_debit_refuses_overdraft(self):
+        ledger.credit(self.user, Decimal('5'))
+        self.assertIsNone(ledger.debit(self.user, Decimal('5.01')))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user).count(), 1)
+        self.assertIsNotNone(ledger.debit(self.user, Decimal('5')))
+        self.assertEqual(ledger.get_balance(self.user), Decimal('0'))
+
+    def test_confirm_deposits_is_idempotent(self):
+        deposits = [Transaction.objects.create(user=self.user, amount=Decimal(amount)) for amount in ('5', '7')]
+        ids = [deposit.id for deposit in deposits]
+        self.assertEqual(ledger.confirm_deposits(ids), 2)
+        self.assertEqual(ledger.confirm_deposits(ids), 0)
+        # галочку сняли и поставили снова — второго зачисления нет
+        Transaction.objects.filter(id=ids[0]).update(is_confirmed=False)
+        self.assertEqual(ledger.confirm_deposits(ids), 0)
+        self.assertEqual(ledger.get_balance(self.user), Decimal('12'))
+        self.assertEqual(self.entries_total(), Decimal('12'))
+
+
+class ReminderTests(TestCase):
+    today = date(2026, 3, 10)
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.handled = []
+
+    def handler(self, batch):
+        self.handled.append([reminder.id for reminder in batch])
+        return len(batch)
+
+    def remind(self, day):
+        return Reminder.objects.create(user=self.user, title='t', date=day).id
+
+    def run_due(self, day=None, batch_size=reminders.BATCH_SIZE):
+        self.handled = []
+        reminders.process_due(self.handler, batch_size=batch_size, today=day or self.today)
+        return [reminder_id for batch in self.handled for reminder_id in batch]
+
+    def test_first_run_starts_today(self):
+        self.remind(self.today - timedelta(days=1))
+        todays = self.remind(self.today)
+        self.assertEqual(self.run_due(), [todays])
+
+    def test_reminder_added_later_on_mark_day(self):
+        first = self.remind(self.today)
+        self.assertEqual(self.run_due(), [first])
+        later = self.remind(self.today)
+        self.assertEqual(self.run_due(), [later])
+        self.assertEqual(self.run_due(), [])
+
+    def test_batches_split_one_date(self):
+        ids = [self.remind(self.today) for _ in range(5)]
+        self.assertEqual(self.run_due(batch_size=2), ids)
+        self.assertEqual([len(batch) for batch in self.handled], [2, 2, 1])
+
+    def test_backdated_reminder_is_skipped(self):
+        self.run_due()
+        self.remind(self.today - timedelta(days=1))
+        tomorrows = self.remind(self.today + timedelta(days=1))
+        self.assertEqual(self.run_due(), [])
+        self.assertEqual(self.run_due(self.today + timedelta(days=1)), [tomorrows])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create(username='alice')
+        self.bob = CustomUser.objects.create(username='bob')
+        self.carol = CustomUser.objects.create(username='carol')
+
+    def messages(self, sender, recipient, count, days_ago=0, is_read=True):
+        ids = [
+            Message.objects.create(sender=sender, recipient=recipient, text=str(i), is_read=is_read).id
+            for i in range(count)
+        ]
+        Message.objects.filter(id__in=ids).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return ids
+
+    def archive(self):
+        call_command('archive_messages', days=30, batch_size=7, stdout=io.StringIO())
+
+    def test_conversation_with_unread_old_messages_is_skipped(self):
+        old = self.messages(self.alice, self.bob, 10, days_ago=60)
+        recent = self.messages(self.bob, self.alice, 3)
+        pending = self.messages(self.alice, self.carol, 4, days_ago=60)
+        self.messages(self.carol, self.alice, 1, days_ago=60, is_read=False)
+        self.archive()
+        self.assertEqual(set(ArchivedMessage.objects.values_list('id', flat=True)), set(old))
+        self.assertEqual(set(Message.objects.values_list('id', flat=True)) & set(old), set())
+        self.assertEqual(Message.objects.filter(id__in=recent + pending).count(), len(recent + pending))
+
+    def test_rerun_after_partial_copy(self):
+        ids = self.messages(self.alice, self.bob, 10, days_ago=60)
+        # прошлый запуск упал между копированием и удалением
+        ArchivedMessage.objects.bulk_create([
+            ArchivedMessage(**row)
+            for row in Message.objects.filter(id__in=ids[:4]).values(*ARCHIVE_FIELDS)
+        ])
+        self.archive()
+        self.assertEqual(sorted(ArchivedMessage.objects.values_list('id', flat=True)), ids)
+        self.assertFalse(Message.objects.exists())
+
+    def test_history_cursor_walks_hot_and_archive(self):
+        ids = self.messages(self.alice, self.bob, 40, days_ago=60) + self.messages(self.bob, self.alice, 30)
+        self.archive()
+        self.assertEqual(ArchivedMessage.objects.count(), 40)
+
+        seen, cursor = [], None
+        with mock.patch.object(chat, 'HISTORY_PAGE_SIZE', 20):
+            while True:
+                request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+                page = chat.history_page(request, self.alice, self.bob)
+                seen += [message.id for message in page]
+                if not page.has_next:
+                    break
+                cursor = page.next_url.split('cursor=')[1]
+        self.assertEqual(seen, sorted(ids, reverse=True))
+
+
+class PromoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_registry_reloads_after_valid_until(self):
+        now = timezone.now()
+        PromoCode.objects.create(code='soon', discount_percentage=10, valid_until=now + timedelta(hours=1))
+        self.assertEqual(promos.get_discount(' soon '), 10)
+        # bulk_create мимо сигналов: версия реестра не меняется
+        PromoCode.objects.bulk_create([PromoCode(code='LATER', discount_percentage=20)])
+        self.assertEqual(promos.get_discount('later'), 0)
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=2)):
+            self.assertEqual(promos.get_discount('soon'), 0)
+            self.assertEqual(promos.get_discount('later'), 20)
+
+    def test_save_invalidates_registry(self):
+        promo = PromoCode.objects.create(code='SALE', discount_percentage=10)
+        self.assertEqual(promos.get_discount('sale'), 10)
+        promo.is_active = False
+        promo.save()
+        self.assertEqual(promos.get_discount('sale'), 0)
+
+
+class SavedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='user')
+        self.product = Product.objects.create(
+            author=self.user, category=Category.objects.create(name='phones'), title='Phone',
+            description='d', price=Decimal('10'), address='a', phone_number='1', tg_username='t', count=1,
+        )
+
+    def test_toggle_adds_and_removes(self):
+        self.assertEqual(saved.saved_ids(self.user.id), frozenset())
+        self.assertTrue(saved.toggle(self.user, self.product.id))
+        self.assertEqual(saved.saved_ids(self.user.id), {self.product.id})
+        self.assertFalse(saved.toggle(self.user, self.product.id))
+        self.assertEqual(saved.saved_ids(self.user.id), frozenset())
+
+    def test_toggle_survives_concurrent_insert(self):
+        # двойной клик: второй запрос вставил строку между нашим DELETE и INSERT
+        real_filter = Product.objects.filter
+
+        def rival_saves_first(*args, **kwargs):
+            Saved.objects.create(author=self.user, product=self.product)
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Product.objects, 'filter', side_effect=rival_saves_first) as product_check:
+            self.assertTrue(saved.toggle(self.user, self.product.id))
+        product_check.assert_called_once()
+        self.assertEqual(Saved.objects.filter(author=self.user).count(), 1)
+        self.assertEqual(saved.saved_ids(self.user.id), {self.product.id})
+
+    def test_toggle_missing_product(self):
+        with self.assertRaises(Product.DoesNotExist):
+            saved.toggle(self.user, self.product.id + 1)
+        self.assertFalse(Saved.objects.exists())
@@ -34,9 +34,41 @@ urlpatterns = [
     path('cart/clear/',cart_clear, name='cart_clear'),
     path('orders/delete/<int:order_id>/', delete_order, name='delete_order'),
     path('orders/clear/', clear_orders, name='clear_orders'),
+    path('cart/promo/', views.apply_promo, name='apply_promo'),
     path('chats/', views.chat_list, name='chat_list'),
+    path('chats/stream/', views.chat_stream, name='chat_stream'),
     path('chats/<int:user_id>/', views.chat_detail, name='chat_detail'),
+    path('chats/<int:user_id>/read/', views.chat_read, name='chat_read'),
+    path('chats/<int:user_id>/history/', views.chat_history, name='chat_history'),
     path('chats/<int:user_id>/block/', views.block_user, name='block_user'),
     path('chats/<int:user_id>/unblock/', views.unblock_user, name='unblock_user'),
 
 ]
+
+query_budgets = {
+    'signup': 1,
+    'profile': (5, 8),
+    'update': (2, 6),
+    'addremovesaved': 3,
+    'saveds': (3, 7),
+    'recently_viewed': (3, 7),
+    'calendar': 3,
+    'logout': 2,
+    'deposit': 3,
+    'buy_now': 13,
+    'add_to_cart': 8,
+    'orders': (5, 8),
+    'cart': (7, 11),
+    'checkout_all': 16,
+    'cart_clear': 6,
+    'apply_promo': 4,
+    'delete_order': 4,
+    'clear_orders': 3,
+    'chat_list': (4, 8),
+    'chat_detail': (9, 14),
+    'chat_history': (5, 7),
+    'chat_read': 6,
+    'chat_stream': 2,
+    'block_user': 7,
+    'unblock_user': 4,
+}
@@ -5,9 +5,22 @@ from django.views import View
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
 from .forms import SignupForm, UpdateProfileForm
-from .models import CustomUser, Saved, Reminder, Transaction, Order, BlockedUser
+from . import promos, saved
+from .cart import PricedCart
+from .checkout import place_order, CheckoutError, ProductUnavailable, OutOfStock, InsufficientFunds
+from .models import CustomUser, Saved, Reminder, Transaction, Order
 from products.models import Product
+from products.search import search_products
+from products.inventory import available_stock, place_hold, release_holds
+from main.pagination import keyset_filter, paginate
+from datetime import timedelta
 from decimal import Decimal
 
 class SignupView(UserPassesTestMixin, View):
@@ -43,11 +56,8 @@ def profile_view(request, username):
     # Получаем пользователя, чей профиль открыт
     owner = get_object_or_404(CustomUser, username=username)
 
-    reminders = []
-    # Загружаем напоминания только если это личный профиль
+    # Напоминания календарь подгружает сам по месяцам (profile_calendar)
     if request.user == owner:
-        reminders = Reminder.objects.filter(user=owner)
-
         # Логика сохранения напоминания через POST
         if request.method == 'POST':
             title = request.POST.get('title')
@@ -57,7 +67,6 @@ def profile_view(request, username):
 
     return render(request, 'profile.html', {
         'customuser': owner,
-        'reminders': reminders
     })
 
 
@@ -97,22 +106,12 @@ class AddRemoveSavedView(LoginRequiredMixin, View):
     login_url = 'login'
 
     def get(self, request, product_id):
-        product = get_object_or_404(Product, id=product_id)
-
-        saved = Saved.objects.filter(
-            author=request.user,
-            product=product
-        )
+        try:
+            is_saved = saved.toggle(request.user, product_id)
+        except Product.DoesNotExist:
+            raise Http404('No Product matches the given query.')
 
-        if saved.exists():
-            saved.delete()
-            messages.info(request, 'Removed.')
-        else:
-            Saved.objects.create(
-                author=request.user,
-                product=product
-            )
-            messages.info(request, 'Saved.')
+        messages.info(request, 'Saved.' if is_saved else 'Removed.')
 
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
@@ -122,11 +121,11 @@ class SavedView(LoginRequiredMixin, View):
 
     def get(self, request):
         q = request.GET.get('q', '')
-        saveds = Saved.objects.filter(author=request.user)
+        saveds = Saved.objects.filter(author=request.user).select_related('product')
 
         if q:
-            products = Product.objects.filter(title__icontains=q)
-            saveds = saveds.filter(product__in=products)
+            products = search_products(Product.objects.all(), q)
+            saveds = saveds.filter(product__in=products.values('id'))
 
         return render(
             request,
@@ -142,7 +141,7 @@ class RecentlyViewedView(View):
 
         q = request.GET.get('q', '')
         if q:
-            products = products.filter(title__icontains=q)
+            products = search_products(products, q).order_by('-search_rank')
 
         return render(
             request,
@@ -153,14 +152,33 @@ class RecentlyViewedView(View):
 # -------- calendar
 
 
-@login_required
-def profile_calendar(request):
-    reminders = Reminder.objects.filter(user=request.user)
+# Больше не отдаём за раз — FullCalendar запрашивает видимый диапазон (~6 недель)
+CALENDAR_MAX_DAYS = 62
 
 
-    return render(request, 'profile.html', {
-        'reminders': reminders
-    })
+def _calendar_day(value):
+    # FullCalendar шлёт ISO с временем и зоной: '2026-09-28T00:00:00+05:00'
+    try:
+        return parse_date((value or '')[:10])
+    except ValueError:
+        return None  # по формату дата, но такой нет: 2026-13-01
+
+
+@login_required
+def profile_calendar(request):
+    """JSON для FullCalendar: напоминания только в видимом окне [start, end), по индексу (user, date)."""
+    start = _calendar_day(request.GET.get('start'))
+    end = _calendar_day(request.GET.get('end'))
+    if start is None:
+        start = timezone.localdate().replace(day=1)
+    if end is None or end <= start or (end - start).days > CALENDAR_MAX_DAYS:
+        end = start + timedelta(days=CALENDAR_MAX_DAYS)
+
+    reminders = Reminder.objects.filter(user=request.user, date__gte=start, date__lt=end).values_list('title', 'date')
+    return JsonResponse(
+        [{'title': title, 'start': day.isoformat()} for title, day in reminders],
+        safe=False,
+    )
 
 # ------------------Transaction--------------
 
@@ -179,6 +197,18 @@ def deposit_money(request):
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
 
+def _session_discount(request):
+    """Скидка по промокоду из сессии; истёкший или выключенный код из сессии убирается."""
+    discount = promos.get_discount(request.session.get('promo_code'))
+    if not discount and 'discount' in request.session:
+        request.session.pop('discount', None)
+        request.session.pop('promo_code', None)
+        messages.info(request, "Промокод больше не действует.")
+    elif discount and discount != request.session.get('discount'):
+        request.session['discount'] = discount
+    return discount
+
+
 @login_required
 def checkout_all(request):
     cart = request.session.get('cart', {})
@@ -186,59 +216,23 @@ def checkout_all(request):
         messages.error(request, "Your cart is empty.")
         return redirect('users:cart')
 
-    base_total_price = 0
-    items_to_buy = []
-
-    # 1. Считаем базовую стоимость всех товаров
-    for p_id, quantity in cart.items():
-        product = get_object_or_404(Product, id=p_id)
-        if product.count < quantity:
-            messages.error(request, f"Not enough stock for {product.title}")
-            return redirect('users:cart')
-
-        base_total_price += product.price * quantity
-        items_to_buy.append({'product': product, 'quantity': quantity, 'base_price': product.price})
-
-    # --- ЛОГИКА ПРОМОКОДА ---
-    discount_percent = request.session.get('discount', 0)
-    discount_amount = (base_total_price * discount_percent) / 100
-    final_total_price = base_total_price - discount_amount
-    # ------------------------
-
-    # 2. Проверяем баланс по финальной цене
-    if request.user.balance < final_total_price:
-        messages.error(request, f"Insufficient funds. Required: ${final_total_price}")
+    discount_percent = _session_discount(request)
+    try:
+        orders, final_total_price, discount_amount = place_order(request.user, cart, discount_percent)
+    except OutOfStock as e:
+        messages.error(request, f"Not enough stock for {e.product.title}")
+        return redirect('users:cart')
+    except InsufficientFunds as e:
+        messages.error(request, f"Insufficient funds. Required: ${e.required}")
+        return redirect('users:cart')
+    except CheckoutError:
+        messages.error(request, "Some products in your cart are no longer available.")
         return redirect('users:cart')
 
-    # 3. Списываем итоговую сумму со скидкой
-    request.user.balance -= final_total_price
-    request.user.save()
-
-    # 4. Обработка каждого товара
-    for item in items_to_buy:
-        product = item['product']
-        quantity = item['quantity']
-
-        # Уменьшаем остаток
-        product.count -= quantity
-        product.save()
-
-        # Рассчитываем цену для истории заказов пропорционально скидке
-        item_base_price = product.price * quantity
-        item_final_price = item_base_price - (item_base_price * discount_percent / 100)
-
-        Order.objects.create(
-            user=request.user,
-            product=product,
-            price=item_final_price,
-            quantity=quantity
-        )
-
-    # 5. Очищаем корзину и промокод
+    # Очищаем корзину и промокод
     request.session['cart'] = {}
-    if 'discount' in request.session:
-        del request.session['discount']
-        del request.session['promo_code']
+    request.session.pop('discount', None)
+    request.session.pop('promo_code', None)
 
     messages.success(request, f"Success! Order placed. Total paid: ${final_total_price} (Saved ${discount_amount})")
     return redirect('users:orders')
@@ -246,6 +240,7 @@ def checkout_all(request):
 @login_required
 def cart_clear(request):
     request.session['cart'] = {}
+    release_holds(request.user)
     return redirect('users:cart')
 
 # -------- by----
@@ -255,48 +250,28 @@ from products.models import Product
 @login_required
 def buy_now(request, product_id):
     if request.method == 'POST':
-        product = get_object_or_404(Product, id=product_id)
         quantity = int(request.POST.get('quantity_hidden', 1))
+        discount_percent = _session_discount(request)
 
-        # --- ЛОГИКА ПРОМОКОДА ---
-        discount_percent = request.session.get('discount', 0)
-        base_price = product.price * quantity
-
-        # Считаем сумму скидки и итоговую цену
-        discount_amount = (base_price * discount_percent) / 100
-        final_price = base_price - discount_amount
-        # ------------------------
-
-        if request.user.balance >= final_price:
-            if product.count >= quantity:
-                # 1. Снимаем деньги (со скидкой)
-                request.user.balance -= final_price
-                request.user.save()
-
-                # 2. Уменьшаем остаток товара
-                product.count -= quantity
-                product.save()
-
-                # 3. Создаем запись в истории заказов
-                # В поле price лучше записывать итоговую цену, которую реально заплатил юзер
-                Order.objects.create(
-                    user=request.user,
-                    product=product,
-                    price=final_price,
-                    quantity=quantity
-                )
-
-                # Удаляем скидку из сессии после покупки (опционально)
-                if 'discount' in request.session:
-                    del request.session['discount']
-                    del request.session['promo_code']
-
-                messages.success(request, f"Покупка совершена! Списано: ${final_price} (Скидка {discount_percent}%)")
-                return redirect('users:orders')
-            else:
-                messages.error(request, "Недостаточно товара на складе.")
+        try:
+            orders, final_price, discount_amount = place_order(
+                request.user, {product_id: quantity}, discount_percent
+            )
+        except OutOfStock:
+            messages.error(request, "Недостаточно товара на складе.")
+        except InsufficientFunds as e:
+            messages.error(request, "Недостаточно средств. Нужно: $" + str(e.required))
+        except ProductUnavailable:
+            raise Http404
+        except CheckoutError:
+            messages.error(request, "Неверное количество.")
         else:
-            messages.error(request, "Недостаточно средств. Нужно: $" + str(final_price))
+            # Удаляем скидку из сессии после покупки (опционально)
+            request.session.pop('discount', None)
+            request.session.pop('promo_code', None)
+
+            messages.success(request, f"Покупка совершена! Списано: ${final_price} (Скидка {discount_percent}%)")
+            return redirect('users:orders')
 
     return redirect('products:detail', product_id=product_id)
 
@@ -306,12 +281,17 @@ def add_to_cart(request, product_id):
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1))
         cart = request.session.get('cart', {})
+        product = get_object_or_404(Product, id=product_id)
 
         p_id = str(product_id)
-        if p_id in cart:
-            cart[p_id] += quantity
-        else:
-            cart[p_id] = quantity
+        new_quantity = cart.get(p_id, 0) + quantity
+        if quantity < 1 or new_quantity > available_stock(product, request.user):
+            messages.error(request, "Недостаточно товара на складе.")
+            return redirect(request.META.get('HTTP_REFERER', '/'))
+
+        # Резервируем на время жизни корзины — строку товара не трогаем
+        place_hold(request.user, product, new_quantity)
+        cart[p_id] = new_quantity
 
         request.session['cart'] = cart
         messages.success(request, f"Добавлено в корзину: {quantity} шт.")
@@ -319,25 +299,47 @@ def add_to_cart(request, product_id):
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
 
+ORDERS_PER_PAGE = 50
+
+
 @login_required
 def orders_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-date')
-    return render(request, 'orders.html', {'orders': orders})
+    orders = Order.objects.filter(user=request.user)
+    page = paginate(
+        request,
+        orders.select_related('product').only(
+            'id', 'date', 'price', 'quantity', 'product__id', 'product__title', 'product__cover'
+        ),
+        ordering='-date',
+        per_page=ORDERS_PER_PAGE,
+    )
+    if page:
+        # Нарастающий итог: одна сумма всех заказов старше страницы (по индексу)
+        # плюс сумма внутри страницы — история целиком не сортируется и не суммируется
+        oldest = page.object_list[-1]
+        running_total = keyset_filter(orders, '-date', oldest.date, oldest.id).aggregate(
+            total=Sum('price')
+        )['total'] or Decimal('0.00')
+        for order in reversed(page.object_list):
+            running_total += order.price
+            order.running_total = running_total
+    return render(request, 'orders.html', {'orders': page, 'page': page})
 
 
 @login_required
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    products = []
-    total_price = 0
+    cart = PricedCart(request.session.get('cart', {}), _session_discount(request), user=request.user)
 
-    # Получаем товары из БД по ID из сессии
-    for p_id, quantity in cart.items():
-        product = get_object_or_404(Product, id=p_id)
-        total_price += product.price * quantity
-        products.append({'product': product, 'quantity': quantity})
+    # Товары, которых уже нет в базе, молча убираем из корзины (раньше вся страница падала в 404)
+    if cart.missing_ids:
+        request.session['cart'] = cart.as_session_cart()
+        messages.info(request, "Some products are no longer available and were removed from your cart.")
 
-    return render(request, 'carts.html', {'products': products, 'total_price': total_price})
+    return render(request, 'carts.html', {
+        'cart': cart,
+        'products': cart.lines,
+        'total_price': cart.total,
+    })
 
 @login_required
 def delete_order(request, order_id):
@@ -358,56 +360,105 @@ def clear_orders(request):
 
 # -----------message------------
 
-from django.db.models import Q
-from .models import CustomUser, Message
+from . import blocks, chat
+from .models import CustomUser, Conversation
 
 
 @login_required
 def chat_detail(request, user_id):
     other_user = get_object_or_404(CustomUser, id=user_id)
 
-    # 1. Проверка блокировки
-    i_blocked_him = BlockedUser.objects.filter(blocker=request.user, blocked=other_user).exists()
-    he_blocked_me = BlockedUser.objects.filter(blocker=other_user, blocked=request.user).exists()
+    # 1. Проверка блокировки (из кэша, в обе стороны)
+    blocking, blocked_by = blocks.block_sets(request.user.id)
+    i_blocked_him = other_user.id in blocking
+    he_blocked_me = other_user.id in blocked_by
 
     if request.method == "POST":
         if not i_blocked_him and not he_blocked_me:
             text = request.POST.get('text', '').strip()
             if text:
-                Message.objects.create(sender=request.user, recipient=other_user, text=text)
+                message = chat.record_message(request.user, other_user, text)
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse(chat.message_event(message), status=201)
                 return redirect('users:chat_detail', user_id=user_id)
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'error': 'Message was not sent.'}, status=403)
 
-    # 2. ПОЛУЧЕНИЕ СООБЩЕНИЙ (Здесь важно имя переменной)
-    chat_data = Message.objects.filter(
-        (Q(sender=request.user) & Q(recipient=other_user)) |
-        (Q(sender=other_user) & Q(recipient=request.user))
-    ).order_by('created_at')
+    # 2. ПОСЛЕДНЯЯ СТРАНИЦА СООБЩЕНИЙ (старые — через chat_history)
+    page = chat.history_page(request, request.user, other_user)
 
-    # 3. ПОМЕЧАЕМ ПРОЧИТАННЫМИ (Используем то же имя chat_data)
-    chat_data.filter(recipient=request.user, is_read=False).update(is_read=True)
+    # 3. ПОМЕЧАЕМ ПРОЧИТАННЫМИ (и обнуляем счётчик в сводке диалога)
+    chat.mark_read(request.user, other_user)
 
     return render(request, 'chat.html', {
         'other_user': other_user,
-        'chat_messages': chat_data,  # Передаем в шаблон
+        'chat_messages': list(reversed(page.object_list)),  # на экране — от старых к новым
+        'page': page,
         'i_blocked_him': i_blocked_him,
-        'he_blocked_me': he_blocked_me
+        'he_blocked_me': he_blocked_me,
+        'live_chat': _live_chat(request),
     })
-from django.db.models import Max
+
 
 @login_required
-def chat_list(request):
+def chat_read(request, user_id):
+    """Открытый чат получил сообщение по стриму — помечаем прочитанным."""
+    if request.method == 'POST':
+        other_user = get_object_or_404(CustomUser, id=user_id)
+        chat.mark_read(request.user, other_user)
+    return HttpResponse(status=204)
+
 
-    chat_users = CustomUser.objects.filter(
-        Q(sent_messages__recipient=request.user) |
-        Q(received_messages__sender=request.user)
-    ).annotate(
-        last_msg_date=Max('sent_messages__created_at')
-    ).exclude(id=request.user.id).distinct().order_by('-last_msg_date')
+def _live_chat(request):
+    # Бесконечный поток работает только под ASGI: WSGI-обработчик сначала
+    # дочитывает асинхронный итератор до конца — ответ не уходит, а поток
+    # воркера занят навсегда.
+    return isinstance(request, ASGIRequest)
 
-    blocked_ids = request.user.blocking.values_list('blocked_id', flat=True)
+
+@login_required
+async def chat_stream(request):
+    """
+    Server-Sent Events: новые сообщения и отчёты о прочтении для текущего
+    пользователя. Асинхронная вьюха — под ASGI-сервером (uvicorn/daphne)
+    открытое соединение не занимает поток. Под WSGI — 204: EventSource
+    больше не переподключается, новые сообщения видны после перезагрузки.
+    """
+    if not _live_chat(request):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    return StreamingHttpResponse(
+        chat.event_stream(user.id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@login_required
+def chat_history(request, user_id):
+    """Следующая (более старая) страница переписки — только фрагмент с сообщениями."""
+    other_user = get_object_or_404(CustomUser, id=user_id)
+    page = chat.history_page(request, request.user, other_user)
+    return render(request, 'chat_messages.html', {
+        'other_user': other_user,
+        'chat_messages': list(reversed(page.object_list)),
+        'page': page,
+    })
+
+
+@login_required
+def chat_list(request):
+    # Сводки диалогов: один запрос по индексу (owner, -last_message_at)
+    conversations = (
+        Conversation.objects.filter(owner=request.user)
+        .select_related('other')
+        .order_by('-last_message_at')
+    )
+
+    blocked_ids, _ = blocks.block_sets(request.user.id)
 
     return render(request, 'chat_list.html', {
-        'users': chat_users,
+        'conversations': conversations,
         'blocked_ids': blocked_ids
     })
 
@@ -415,32 +466,31 @@ def chat_list(request):
 @login_required
 def block_user(request, user_id):
     target_user = get_object_or_404(CustomUser, id=user_id)
-    BlockedUser.objects.get_or_create(blocker=request.user, blocked=target_user)
+    blocks.block(request.user, target_user)
     return redirect('users:chat_detail', user_id=user_id)
 
 @login_required
 def unblock_user(request, user_id):
     target_user = get_object_or_404(CustomUser, id=user_id)
-    BlockedUser.objects.filter(blocker=request.user, blocked=target_user).delete()
+    blocks.unblock(request.user, target_user)
     return redirect('users:chat_detail', user_id=user_id)
 
 
 # ----- promokod -----
-from .models import PromoCode
 
 
 def apply_promo(request):
     if request.method == "POST":
-        code = request.POST.get('promo_code')
-        try:
-            promo = PromoCode.objects.get(code__iexact=code, is_active=True)
+        code = promos.normalize(request.POST.get('promo_code'))
+        discount = promos.get_discount(code)
+        if discount:
             # Сохраняем скидку в сессии
-            request.session['discount'] = promo.discount_percentage
-            request.session['promo_code'] = promo.code
-            messages.success(request, f"Промокод '{code}' применен! Скидка {promo.discount_percentage}%")
-        except PromoCode.DoesNotExist:
-            request.session['discount'] = 0
-            request.session['promo_code'] = None
-            messages.error(request, "Неверный или неактивный промокод")
+            request.session['discount'] = discount
+            request.session['promo_code'] = code
+            messages.success(request, f"Промокод '{code}' применен! Скидка {discount}%")
+        else:
+            request.session.pop('discount', None)
+            request.session.pop('promo_code', None)
+            messages.error(request, "Неверный, неактивный или истёкший промокод")
 
     return redirect('users:cart')